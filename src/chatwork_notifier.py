@@ -8,7 +8,7 @@ import urllib.parse
 
 import yaml
 
-from src.slot_analyzer import count_30min_blocks, count_consecutive_blocks
+from src.slot_analyzer import count_consecutive_blocks, recalculate_detail
 
 logger = logging.getLogger(__name__)
 
@@ -101,24 +101,13 @@ def _apply_category_classification(data: dict, staff_rules: dict):
             base_name = _strip_suffix(staff_name)
             if staff_name in doctors or base_name in doctors:
                 detail['category'] = 'doctor'
-                _recalculate_detail(detail, dr_threshold)
+                recalculate_detail(detail, dr_threshold)
             elif staff_name in hygienists or base_name in hygienists:
                 detail['category'] = 'hygienist'
-                _recalculate_detail(detail, dh_threshold)
+                recalculate_detail(detail, dh_threshold)
             else:
                 detail['category'] = 'unknown'
-                _recalculate_detail(detail, 30)
-
-
-def _recalculate_detail(detail: dict, threshold: int):
-    """raw_slot_timesがあれば指定閾値で枠数を再計算"""
-    raw_times = detail.get('raw_slot_times')
-    if not raw_times:
-        return
-    interval = detail.get('slot_interval', 5)
-    consec = threshold // interval
-    detail['blocks'] = count_30min_blocks(raw_times, interval, consec)
-    detail['threshold_minutes'] = threshold
+                recalculate_detail(detail, 30)
 
 
 def _apply_web_booking_filter(data: dict, staff_rules: dict, settings: dict):
@@ -157,10 +146,9 @@ def _apply_web_booking_filter(data: dict, staff_rules: dict, settings: dict):
 
 def _sort_by_clinic_order(data: dict):
     """CLINIC_ORDER順にソート（main.pyと同等）"""
-    from web.routes.staff import CLINIC_ORDER
-    order_map = {name: i for i, name in enumerate(CLINIC_ORDER)}
+    from web.routes.staff import CLINIC_RANK
     data['results'].sort(
-        key=lambda r: order_map.get(r.get('clinic', ''), 999)
+        key=lambda r: CLINIC_RANK.get(r.get('clinic', ''), 999)
     )
 
 
@@ -1,12 +1,24 @@
 """設定ファイル読み込みモジュール"""
 
+import os
 import yaml
+import threading
 from pathlib import Path
 from typing import Dict, List, Any
 
 from .secret_manager import get_credentials
 from .gcs_helper import download_from_gcs
 
+# libyamlがあればC実装のローダー/ダンパーを使用（純Python版より大幅に高速）
+# Web側（rules/staff）もここから参照する
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
+# load_yaml_cached用: パス -> ((mtime_ns, size), データ)
+_yaml_cache: Dict[str, tuple] = {}
+
 
 def load_yaml(file_path: Path) -> Dict[str, Any]:
     """YAMLファイルを読み込む"""
@@ -14,6 +26,58 @@ def load_yaml(file_path: Path) -> Dict[str, Any]:
         return yaml.safe_load(f)
 
 
+def load_yaml_cached(file_path) -> Any:
+    """YAMLファイルを読み込む（mtime/サイズ不変ならパース済みデータを再利用）
+
+    返り値はキャッシュ共有オブジェクトのため変更しないこと（変更する場合はdeepcopyする）。
+    ファイルが存在しない場合はFileNotFoundError。
+    """
+    path = os.fspath(file_path)
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _yaml_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.load(f, Loader=YamlLoader)
+    _yaml_cache[path] = (key, data)
+    return data
+
+
+def invalidate_yaml_cache(file_path) -> None:
+    """load_yaml_cachedのキャッシュを破棄（ファイル保存後に呼ぶ）"""
+    _yaml_cache.pop(os.fspath(file_path), None)
+
+
+def write_bytes_atomic(file_path, data: bytes) -> bool:
+    """バイト列をファイルに書き込む（内容が同一なら何もしない）
+
+    一時ファイルに書いてからリネームするため、読み込み側が書きかけのファイルを見ることはない。
+    失敗時は一時ファイルを削除して例外を送出する。書き込んだ場合True、同一でスキップした場合False。
+    """
+    path = os.fspath(file_path)
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
 def load_config(config_dir: Path = None) -> Dict[str, Any]:
     """全ての設定ファイルを読み込む"""
     if config_dir is None:
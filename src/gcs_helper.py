@@ -78,20 +78,25 @@ def sync_output_from_gcs(output_dir: str) -> int:
     """GCSのoutput/ファイルをローカルに同期"""
     if not _is_cloud_run():
         return 0
+    # config_loader は本モジュールをインポートするため遅延インポート
+    from .config_loader import write_bytes_atomic
     count = 0
     try:
         client = _get_client()
         bucket = client.bucket(_BUCKET_NAME)
         blobs = bucket.list_blobs(prefix='output/')
         os.makedirs(output_dir, exist_ok=True)
+        # 既存ファイル名は1回の走査で取得（blobごとのexists呼び出しを省く）
+        with os.scandir(output_dir) as it:
+            existing = {e.name for e in it}
         for blob in blobs:
             filename = os.path.basename(blob.name)
-            if not filename:
+            if not filename or filename in existing:
                 continue
-            local_path = os.path.join(output_dir, filename)
-            if not os.path.exists(local_path):
-                blob.download_to_filename(local_path)
-                count += 1
+            # 一時ファイル経由で置き換え、Web側の走査が書きかけのファイルを拾わないようにする
+            write_bytes_atomic(os.path.join(output_dir, filename), blob.download_as_bytes())
+            existing.add(filename)
+            count += 1
         if count > 0:
             logger.info(f"GCSからoutput/{count}ファイルを同期")
     except Exception as e:
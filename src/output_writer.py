@@ -6,12 +6,13 @@ from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Dict, List, Any
 from src.gcs_helper import upload_to_gcs
+from src.config_loader import write_bytes_atomic
 
 
 def write_json(results: Dict[str, Any], output_path: Path) -> None:
-    """JSON形式で出力"""
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    """JSON形式で出力（Webダッシュボードが書きかけのファイルを読まないようアトミックに書く）"""
+    body = json.dumps(results, ensure_ascii=False, indent=2).encode('utf-8')
+    write_bytes_atomic(output_path, body)
 
 
 def write_csv(results: Dict[str, Any], output_path: Path) -> None:
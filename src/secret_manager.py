@@ -121,8 +121,9 @@ def _save_to_yaml(credentials: Dict[str, Any], config_dir: str) -> None:
             clinic['id'] = cred['id']
             clinic['password'] = cred['password']
 
-    with open(clinics_path, 'w', encoding='utf-8') as f:
-        yaml.dump(config, f, allow_unicode=True, default_flow_style=False)
+    # config_loader は本モジュールをインポートするため遅延インポート
+    from .config_loader import write_bytes_atomic
+    write_bytes_atomic(clinics_path, yaml.dump(config, allow_unicode=True, default_flow_style=False).encode('utf-8'))
 
 
 def get_credentials(config_dir: str = None) -> Dict[str, Any]:
@@ -112,9 +112,9 @@ def analyze_doctor_slots(
     actual_interval = detect_slot_interval(slot_times, interval)
     actual_consecutive = max(threshold_minutes // actual_interval, 2)  # 最低2連続を保証
 
-    # 時間範囲表示用にグループを取得
-    _, block_ranges = count_consecutive_blocks(
-        slot_times, actual_consecutive, actual_interval
+    # 正しい30分ブロック数と時間範囲表示用のグループを1パスで取得
+    actual_blocks, block_ranges = count_blocks_and_ranges(
+        slot_times, actual_interval, actual_consecutive
     )
 
     time_strs = [
@@ -122,9 +122,6 @@ def analyze_doctor_slots(
         for start, end in block_ranges
     ]
 
-    # 正しい30分ブロック数を計算
-    actual_blocks = count_30min_blocks(slot_times, actual_interval, actual_consecutive)
-
     return {
         'doctor': doctor_name,
         'blocks': actual_blocks,
@@ -195,3 +192,68 @@ def count_30min_blocks(
     total_blocks += current_count // consecutive_required
 
     return total_blocks
+
+
+def count_blocks_and_ranges(
+    slot_times: List[int],
+    slot_interval: int = 5,
+    consecutive_required: int = 6
+) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    count_30min_blocks と count_consecutive_blocks の結果を1回のソート・走査で求める
+
+    Args:
+        slot_times: 空きスロットの時間リスト（分単位）
+        slot_interval: スロット間隔（分）
+        consecutive_required: 30分に必要な連続スロット数
+
+    Returns:
+        (30分ブロックの数, [(開始時間, 終了時間), ...])
+    """
+    if not slot_times:
+        return 0, []
+
+    sorted_times = sorted(slot_times)
+    total_blocks = 0
+    ranges = []
+    current_start = sorted_times[0]
+    current_count = 1
+    prev_time = sorted_times[0]
+
+    for time in sorted_times[1:]:
+        if time == prev_time + slot_interval:
+            current_count += 1
+        else:
+            total_blocks += current_count // consecutive_required
+            if current_count >= consecutive_required:
+                ranges.append((current_start, prev_time))
+            current_start = time
+            current_count = 1
+        prev_time = time
+
+    # 最後のグループ
+    total_blocks += current_count // consecutive_required
+    if current_count >= consecutive_required:
+        ranges.append((current_start, prev_time))
+
+    return total_blocks, ranges
+
+
+def recalculate_detail(detail: Dict[str, Any], threshold: int) -> None:
+    """raw_slot_timesがあれば指定閾値で枠数（blocks・times）を再計算
+
+    旧データ（raw_slot_timesなし）は再計算不可のためそのまま。
+    """
+    raw_times = detail.get('raw_slot_times')
+    if not raw_times:
+        return
+    interval = detail.get('slot_interval', 5)
+    consec = threshold // interval
+    # 同じ閾値・同じ連続数で計算済みなら再計算不要
+    # （analyze_doctor_slots は最低2連続に切り上げるため、consec < 2 の保存値は一致しない）
+    if (detail.get('threshold_minutes') == threshold and 'times' in detail
+            and 'slot_interval' in detail and consec >= 2):
+        return
+    detail['blocks'], ranges = count_blocks_and_ranges(raw_times, interval, consec)
+    detail['times'] = [format_time_range(s, e, interval) for s, e in ranges]
+    detail['threshold_minutes'] = threshold
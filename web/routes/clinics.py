@@ -1,35 +1,19 @@
 """分院管理API"""
 
-import os
-import yaml
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, request, current_app
 from src.secret_manager import get_credentials, save_credentials
+from web.routes.responses import json_response
+from web.routes.rules import (
+    clinics_config_lock, load_clinics_config, load_clinics_config_cached, save_clinics_config,
+)
 
 bp = Blueprint('clinics', __name__)
 
 
-def load_clinics_config():
-    """clinics.yamlを読み込む"""
-    config_path = current_app.config['CONFIG_PATH']
-    clinics_path = os.path.join(config_path, 'clinics.yaml')
-
-    with open(clinics_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
-
-
-def save_clinics_config(data):
-    """clinics.yamlに保存"""
-    config_path = current_app.config['CONFIG_PATH']
-    clinics_path = os.path.join(config_path, 'clinics.yaml')
-
-    with open(clinics_path, 'w', encoding='utf-8') as f:
-        yaml.dump(data, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
-
-
 @bp.route('/', methods=['GET'])
 def get_clinics():
     """全分院情報を取得（dent-sys + Stransa）"""
-    config = load_clinics_config()
+    config = load_clinics_config_cached()
     config_path = current_app.config['CONFIG_PATH']
 
     # Secret Managerから認証情報を取得（ログインID表示用）
@@ -62,7 +46,7 @@ def get_clinics():
             'system': 'stransa'
         })
 
-    return jsonify(result)
+    return json_response(result)
 
 
 def _find_clinic_in_config(config, clinic_name):
@@ -79,16 +63,17 @@ def _find_clinic_in_config(config, clinic_name):
 @bp.route('/<clinic_name>/toggle', methods=['POST'])
 def toggle_clinic(clinic_name):
     """分院の有効/無効を切り替え"""
-    config = load_clinics_config()
-    clinic, section = _find_clinic_in_config(config, clinic_name)
+    with clinics_config_lock:
+        config = load_clinics_config()
+        clinic, section = _find_clinic_in_config(config, clinic_name)
 
-    if not clinic:
-        return jsonify({'error': 'Clinic not found'}), 404
+        if not clinic:
+            return json_response({'error': 'Clinic not found'}, 404)
 
-    clinic['enabled'] = not clinic.get('enabled', True)
-    save_clinics_config(config)
+        clinic['enabled'] = not clinic.get('enabled', True)
+        save_clinics_config(config)
 
-    return jsonify({
+    return json_response({
         'success': True,
         'clinic': clinic_name,
         'enabled': clinic['enabled']
@@ -100,33 +85,34 @@ def update_clinic(clinic_name):
     """分院情報を更新"""
     data = request.get_json()
     config_path = current_app.config['CONFIG_PATH']
-    config = load_clinics_config()
-    clinic, section = _find_clinic_in_config(config, clinic_name)
+    with clinics_config_lock:
+        config = load_clinics_config()
+        clinic, section = _find_clinic_in_config(config, clinic_name)
 
-    if not clinic:
-        return jsonify({'error': 'Clinic not found'}), 404
+        if not clinic:
+            return json_response({'error': 'Clinic not found'}, 404)
 
-    if 'url' in data:
-        clinic['url'] = data['url']
-    if 'enabled' in data:
-        clinic['enabled'] = data['enabled']
+        if 'url' in data:
+            clinic['url'] = data['url']
+        if 'enabled' in data:
+            clinic['enabled'] = data['enabled']
 
-    save_clinics_config(config)
+        save_clinics_config(config)
 
-    # 認証情報が含まれる場合はSecret Managerも更新
-    if 'id' in data or 'password' in data:
-        cred_key = 'stransa_clinics' if section == 'stransa_clinics' else 'clinics'
-        credentials = get_credentials(config_path)
-        for cred in credentials.get(cred_key, []):
-            if cred['name'] == clinic_name:
-                if 'id' in data:
-                    cred['id'] = data['id']
-                if 'password' in data:
-                    cred['password'] = data['password']
-                break
-        save_credentials(credentials, config_path)
+        # 認証情報が含まれる場合はSecret Managerも更新
+        if 'id' in data or 'password' in data:
+            cred_key = 'stransa_clinics' if section == 'stransa_clinics' else 'clinics'
+            credentials = get_credentials(config_path)
+            for cred in credentials.get(cred_key, []):
+                if cred['name'] == clinic_name:
+                    if 'id' in data:
+                        cred['id'] = data['id']
+                    if 'password' in data:
+                        cred['password'] = data['password']
+                    break
+            save_credentials(credentials, config_path)
 
-    return jsonify({'success': True, 'clinic': clinic_name})
+    return json_response({'success': True, 'clinic': clinic_name})
 
 
 @bp.route('/', methods=['POST'])
@@ -138,33 +124,34 @@ def add_clinic():
     required_fields = ['name', 'url', 'id', 'password']
     for field in required_fields:
         if field not in data:
-            return jsonify({'error': f'{field} is required'}), 400
+            return json_response({'error': f'{field} is required'}, 400)
 
     system = data.get('system', 'dent-sys')
     section = 'stransa_clinics' if system == 'stransa' else 'clinics'
 
-    # 非機密情報をYAMLに追加
-    config = load_clinics_config()
-    new_clinic_yaml = {
-        'name': data['name'],
-        'url': data['url'],
-        'enabled': data.get('enabled', True)
-    }
-    config[section].append(new_clinic_yaml)
-    save_clinics_config(config)
-
-    # 認証情報をSecret Managerに追加
-    credentials = get_credentials(config_path)
-    if section not in credentials:
-        credentials[section] = []
-    credentials[section].append({
-        'name': data['name'],
-        'id': data['id'],
-        'password': data['password']
-    })
-    save_credentials(credentials, config_path)
+    with clinics_config_lock:
+        # 非機密情報をYAMLに追加
+        config = load_clinics_config()
+        new_clinic_yaml = {
+            'name': data['name'],
+            'url': data['url'],
+            'enabled': data.get('enabled', True)
+        }
+        config[section].append(new_clinic_yaml)
+        save_clinics_config(config)
+
+        # 認証情報をSecret Managerに追加
+        credentials = get_credentials(config_path)
+        if section not in credentials:
+            credentials[section] = []
+        credentials[section].append({
+            'name': data['name'],
+            'id': data['id'],
+            'password': data['password']
+        })
+        save_credentials(credentials, config_path)
 
-    return jsonify({'success': True, 'clinic': data['name']})
+    return json_response({'success': True, 'clinic': data['name']})
 
 
 @bp.route('/<clinic_name>', methods=['DELETE'])
@@ -172,29 +159,30 @@ def delete_clinic(clinic_name):
     """分院を削除"""
     config_path = current_app.config['CONFIG_PATH']
 
-    # YAMLから削除（両セクションを検索）
-    config = load_clinics_config()
-    deleted = False
-    for section in ['clinics', 'stransa_clinics']:
-        items = config.get(section, [])
-        original_count = len(items)
-        config[section] = [c for c in items if c.get('name') != clinic_name]
-        if len(config[section]) < original_count:
-            deleted = True
-            cred_key = section
-            break
+    with clinics_config_lock:
+        # YAMLから削除（両セクションを検索）
+        config = load_clinics_config()
+        deleted = False
+        for section in ['clinics', 'stransa_clinics']:
+            items = config.get(section, [])
+            original_count = len(items)
+            config[section] = [c for c in items if c.get('name') != clinic_name]
+            if len(config[section]) < original_count:
+                deleted = True
+                cred_key = section
+                break
 
-    if not deleted:
-        return jsonify({'error': 'Clinic not found'}), 404
+        if not deleted:
+            return json_response({'error': 'Clinic not found'}, 404)
 
-    save_clinics_config(config)
+        save_clinics_config(config)
 
-    # Secret Managerからも削除
-    credentials = get_credentials(config_path)
-    credentials[cred_key] = [
-        c for c in credentials.get(cred_key, [])
-        if c['name'] != clinic_name
-    ]
-    save_credentials(credentials, config_path)
+        # Secret Managerからも削除
+        credentials = get_credentials(config_path)
+        credentials[cred_key] = [
+            c for c in credentials.get(cred_key, [])
+            if c['name'] != clinic_name
+        ]
+        save_credentials(credentials, config_path)
 
-    return jsonify({'success': True, 'clinic': clinic_name})
+    return json_response({'success': True, 'clinic': clinic_name})
@@ -1,10 +1,9 @@
 """メインページルート"""
 
 import os
-import json
-import glob
+import re
 import sys
-import yaml
+import orjson
 from flask import Blueprint, render_template, current_app
 
 # プロジェクトルートをパスに追加（src.slot_analyzer をインポートするため）
@@ -12,71 +11,68 @@ _project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 if _project_root not in sys.path:
     sys.path.insert(0, _project_root)
 
-from src.slot_analyzer import count_30min_blocks, count_consecutive_blocks, format_time_range
+from src.slot_analyzer import recalculate_detail
+from src.config_loader import load_yaml_cached
+from web.routes.results import get_result_files
 
 bp = Blueprint('main', __name__)
 
+# Stransa (1)/(2) サフィックス
+_SUFFIX_RE = re.compile(r'\(\d+\)$')
+
+# staff_by_clinic（共有キャッシュ）-> {分院名: web_bookingのfrozenset}
+_web_booking_cache = (None, {})
+
+
+def _strip_suffix(name):
+    """Stransa (1)/(2) サフィックスを除去"""
+    return _SUFFIX_RE.sub('', name).strip()
+
 
 def get_latest_result():
     """最新のチェック結果を取得"""
-    output_path = current_app.config['OUTPUT_PATH']
-    json_files = glob.glob(os.path.join(output_path, 'slot_check_*.json'))
-
-    if not json_files:
+    # /api/results/ と同じファイル一覧（ファイル名形式の検証・GCS同期待ち込み）の先頭を使う
+    files = get_result_files()
+    if not files:
         return None
-
-    # 最新のファイルを取得
-    latest_file = max(json_files, key=os.path.getmtime)
+    latest_file = files[0]['path']
 
     try:
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(latest_file, 'rb') as f:
+            return orjson.loads(f.read())
     except Exception:
         return None
 
 
 def _load_staff_rules():
-    """staff_rules.yamlを読み込む"""
-    config_path = current_app.config['CONFIG_PATH']
-    path = os.path.join(config_path, 'staff_rules.yaml')
-    if not os.path.exists(path):
-        return {'staff_by_clinic': {}}
-    with open(path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f) or {'staff_by_clinic': {}}
+    """staff_rules.yamlを読み込む（staff.pyの共通キャッシュを使用、変更しないこと）"""
+    from web.routes.staff import load_staff_rules_cached
+    return load_staff_rules_cached()
 
 
 def _load_clinics_settings():
-    """clinics.yamlのsettingsを読み込む"""
+    """clinics.yamlのsettingsを読み込む（返り値は共有キャッシュのため変更しないこと）"""
     config_path = current_app.config['CONFIG_PATH']
-    path = os.path.join(config_path, 'clinics.yaml')
-    if not os.path.exists(path):
+    try:
+        config = load_yaml_cached(os.path.join(config_path, 'clinics.yaml')) or {}
+    except FileNotFoundError:
         return {}
-    with open(path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f) or {}
     return config.get('settings', {})
 
 
-def _recalculate_detail(detail, threshold):
-    """raw_slot_timesがあれば指定閾値で枠数を再計算"""
-    raw_times = detail.get('raw_slot_times')
-    if not raw_times:
-        return  # 旧データは再計算不可
-    interval = detail.get('slot_interval', 5)
-    consec = threshold // interval
-    detail['blocks'] = count_30min_blocks(raw_times, interval, consec)
-    _, ranges = count_consecutive_blocks(raw_times, consec, interval)
-    detail['times'] = [format_time_range(s, e, interval) for s, e in ranges]
-    detail['threshold_minutes'] = threshold
+def _web_booking_sets(staff_by_clinic):
+    """分院別のweb_booking集合を取得（staff_rulesのキャッシュ更新時のみ再構築）"""
+    global _web_booking_cache
+    if _web_booking_cache[0] is not staff_by_clinic:
+        _web_booking_cache = (staff_by_clinic, {
+            name: frozenset(cfg.get('web_booking') or [])
+            for name, cfg in staff_by_clinic.items()
+        })
+    return _web_booking_cache[1]
 
 
 def _apply_category_classification(data):
     """スタッフに職種分類(doctor/hygienist)と閾値情報を付与"""
-    import re
-
-    def _strip_suffix(name):
-        """Stransa (1)/(2) サフィックスを除去"""
-        return re.sub(r'\(\d+\)$', '', name).strip()
-
     staff_rules = _load_staff_rules()
     staff_by_clinic = staff_rules.get('staff_by_clinic', {})
 
@@ -95,15 +91,15 @@ def _apply_category_classification(data):
             base_name = _strip_suffix(staff_name)
             if staff_name in doctors or base_name in doctors:
                 detail['category'] = 'doctor'
-                _recalculate_detail(detail, dr_threshold)
+                recalculate_detail(detail, dr_threshold)
                 detail.setdefault('threshold_minutes', dr_threshold)
             elif staff_name in hygienists or base_name in hygienists:
                 detail['category'] = 'hygienist'
-                _recalculate_detail(detail, dh_threshold)
+                recalculate_detail(detail, dh_threshold)
                 detail.setdefault('threshold_minutes', dh_threshold)
             else:
                 detail['category'] = 'unknown'
-                _recalculate_detail(detail, 30)
+                recalculate_detail(detail, 30)
                 detail.setdefault('threshold_minutes', 30)
             blocks = detail.get('blocks', 0)
             if detail['category'] == 'doctor':
@@ -126,35 +122,29 @@ def _apply_web_booking_filter(data):
     """web_bookingフィルタを適用"""
     staff_rules = _load_staff_rules()
     settings = _load_clinics_settings()
-    staff_by_clinic = staff_rules.get('staff_by_clinic', {})
+    web_booking_sets = _web_booking_sets(staff_rules.get('staff_by_clinic', {}))
     min_blocks = settings.get('minimum_blocks_required', 4)
 
     clinics_with_availability = 0
 
     for result in data.get('results', []):
-        clinic_name = result.get('clinic', '')
-        clinic_config = staff_by_clinic.get(clinic_name, {})
-        web_booking = clinic_config.get('web_booking', [])
+        web_booking_set = web_booking_sets.get(result.get('clinic', ''))
 
-        if not web_booking:
+        if not web_booking_set:
             # web_booking未設定 → 結果をクリア（WEBタグ未設定 = 集計対象外）
             result['details'] = []
             result['total_30min_blocks'] = 0
             result['result'] = False
             continue
 
-        web_booking_set = set(web_booking)
         # Stransa のスタッフ名は (1), (2) サフィックス付きの場合がある
         # 例: DH小森(1), DH山本真(2) → DH小森, DH山本真 でマッチ
-        import re
-        def _strip_suffix(name):
-            return re.sub(r'\(\d+\)$', '', name).strip()
         filtered = [
             d for d in result.get('details', [])
             if d.get('doctor', '') in web_booking_set or _strip_suffix(d.get('doctor', '')) in web_booking_set
         ]
         result['details'] = filtered
-        total = sum(d.get('blocks', 0) for d in filtered)
+        total = sum([d.get('blocks', 0) for d in filtered])
         result['total_30min_blocks'] = total
         result['result'] = total >= min_blocks
 
@@ -169,10 +159,9 @@ def _apply_web_booking_filter(data):
 
 def _sort_by_clinic_order(data):
     """結果をCLINIC_ORDERの順序でソート"""
-    from web.routes.staff import CLINIC_ORDER
-    order_map = {name: i for i, name in enumerate(CLINIC_ORDER)}
+    from web.routes.staff import CLINIC_RANK
     data['results'].sort(
-        key=lambda r: order_map.get(r.get('clinic', ''), 999)
+        key=lambda r: CLINIC_RANK.get(r.get('clinic', ''), 999)
     )
     return data
 
@@ -0,0 +1,30 @@
+"""APIレスポンス共通ヘルパー"""
+
+import orjson
+from flask import Response
+
+
+def json_response(obj, status=200, etag=None, last_modified=0):
+    """orjsonでシリアライズしたJSONレスポンスを返す（jsonifyより高速）
+
+    シリアライズ済みのbytesはそのまま本文にする。etag指定時はETag/Last-Modifiedを付与。
+    YAML由来の辞書に数値キーが混ざっても失敗しないよう OPT_NON_STR_KEYS を付ける。
+    """
+    body = obj if isinstance(obj, bytes) else orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    response = Response(body, status=status, mimetype='application/json')
+    if etag is not None:
+        with_validators(response, etag, last_modified)
+    return response
+
+
+def with_validators(response, etag, last_modified):
+    """レスポンスにETag/Last-Modifiedを付与
+
+    no-cacheで毎回再検証させる（Last-Modifiedだけだとブラウザが経験則で
+    キャッシュを再利用し、ポーリング中に新しい結果が見えなくなるため）。
+    """
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
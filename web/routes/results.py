@@ -1,57 +1,227 @@
 """結果表示API"""
 
 import os
-import json
-import glob
+import re
 import sys
+import ssl
 import time
-import yaml
-from flask import Blueprint, jsonify, request, current_app, send_file
+import asyncio
+import calendar
+import logging
+import threading
+import traceback
+import dataclasses
+import urllib.request
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+from flask import Blueprint, Response, request, current_app, send_file
 
 # プロジェクトルートをパスに追加
 _project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 if _project_root not in sys.path:
     sys.path.insert(0, _project_root)
 
-from src.slot_analyzer import count_30min_blocks, count_consecutive_blocks, format_time_range
+from src.slot_analyzer import count_30min_blocks, recalculate_detail
 from src.gcs_helper import sync_output_from_gcs
+from src.browser_pool import get_browser, run_async
+from src.config_loader import load_config, load_yaml_cached
+from src.output_writer import save_results
+from web.routes.responses import json_response, with_validators
 
 bp = Blueprint('results', __name__)
 
+JST = timezone(timedelta(hours=9))
+
+
+@dataclasses.dataclass(slots=True)
+class _CheckState:
+    """バックグラウンドチェック状態（更新・参照は _check_lock を保持して行う）"""
+    thread: Optional[threading.Thread] = None
+    started_at: Optional[float] = None
+    result: Optional[bool] = None  # None=未実行, True=成功, False=失敗
+    error: Optional[str] = None
+
+
 # バックグラウンドチェック状態管理
-_check_started_at = None
-_check_thread = None
-_check_result = None  # None=未実行, True=成功, False=失敗
-_check_error = None
+_check_state = _CheckState()
+_check_lock = threading.Lock()
 _CHECK_TIMEOUT = 1200  # 20分タイムアウト（Semaphore=1逐次実行対応）
 
+# 接続テスト用SSLコンテキスト（CA証明書の読み込みはプロセスで1回のみ）
+_SSL_CONTEXT = ssl.create_default_context()
+
+# slot_check_YYYYMMDD(対象日)_YYYYMMDD(実行日)_HHMMSS(実行時刻).json
+_RESULT_FILE_LEN = len('slot_check_YYYYMMDD_YYYYMMDD_HHMMSS.json')
+
+
+def _parse_result_filename(name):
+    """結果ファイル名を (対象日, 実行日, 実行時刻) に分解（形式外ならNone）
+
+    固定長のため正規表現ではなくオフセットで切り出す。
+    """
+    if not (len(name) == _RESULT_FILE_LEN and name.startswith('slot_check_')
+            and name.endswith('.json') and name[19] == '_' and name[28] == '_'
+            and name.isascii()):
+        return None
+    parts = (name[11:19], name[20:28], name[29:35])
+    if not (parts[0].isdigit() and parts[1].isdigit() and parts[2].isdigit()):
+        return None
+    return parts
+
+# Stransa のスタッフ名は (1), (2) サフィックス付きの場合がある
+_SUFFIX_RE = re.compile(r'\(\d+\)$')
+
+# 分院ごとの職種セット・閾値の前計算結果: (元のstaff_rules, rules)
+_clinic_rules_cache = (None, {})
+
+
+def _strip_suffix(name):
+    """Stransa (1)/(2) サフィックスを除去"""
+    return _SUFFIX_RE.sub('', name).strip()
+
+
+def _cache_validators(*paths):
+    """レスポンスの元になるファイル群の (mtime_ns, size) からETagとLast-Modifiedを作る
+
+    存在しないファイルは '0' として扱う。レスポンス生成前に呼ぶこと
+    （生成中にファイルが更新されても、古いETagなら次回は再取得されるだけで済む）。
+    """
+    parts = []
+    last_modified = 0
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            parts.append('0')
+            continue
+        parts.append(f'{st.st_mtime_ns:x}-{st.st_size:x}')
+        last_modified = max(last_modified, st.st_mtime)
+    return '.'.join(parts), last_modified
+
+
+def _not_modified(etag, last_modified):
+    """If-None-Matchが一致すれば304レスポンスを返す（一致しなければNone）"""
+    if request.if_none_match.contains(etag):
+        return with_validators(Response(status=304), etag, last_modified)
+    return None
+
 
 def load_staff_rules():
-    """staff_rules.yamlを読み込む（staff.pyの共通関数を使用）"""
-    from web.routes.staff import load_staff_rules as _load
+    """staff_rules.yamlを読み込む（staff.pyの共通キャッシュを使用、変更しないこと）"""
+    from web.routes.staff import load_staff_rules_cached as _load
     return _load()
 
 
+# 職種の優先度（矯正 > 歯科医師 > 衛生士 > 不明）
+_CATEGORY_PRIORITY = {'unknown': 0, 'hygienist': 1, 'doctor': 2, 'orthodontist': 3}
+
+
+def _build_clinic_rules(staff_by_clinic):
+    """分院ごとに職種セット・メモ・閾値・WEB予約セットを前計算"""
+    rules = {}
+    for clinic_name, clinic_config in staff_by_clinic.items():
+        # 手編集YAMLの空キー（web_booking: など）はNoneになるため or で空に寄せる
+        clinic_config = clinic_config or {}
+        thresholds = clinic_config.get('slot_threshold') or {}
+        # スタッフ名→職種（優先度の低い順に登録し、矯正が最優先になるよう上書き）
+        category_map = {}
+        for key, category in (('hygienists', 'hygienist'), ('doctors', 'doctor'), ('orthodontists', 'orthodontist')):
+            category_map.update(dict.fromkeys(clinic_config.get(key) or [], category))
+        dr_threshold = thresholds.get('doctor', 30)
+        dh_threshold = thresholds.get('hygienist', 30)
+        ortho_threshold = thresholds.get('orthodontist', 30)
+        rules[clinic_name] = {
+            'doctors': frozenset(clinic_config.get('doctors') or []),
+            'hygienists': frozenset(clinic_config.get('hygienists') or []),
+            'category_map': category_map,
+            'memos': clinic_config.get('memos') or {},
+            'dr_threshold': dr_threshold,
+            'dh_threshold': dh_threshold,
+            'category_thresholds': {
+                'doctor': dr_threshold,
+                'hygienist': dh_threshold,
+                'orthodontist': ortho_threshold,
+                'unknown': 30,
+            },
+            'web_booking': frozenset(clinic_config.get('web_booking') or []),
+        }
+    return rules
+
+
+_EMPTY_CLINIC_RULES = _build_clinic_rules({'': {}})['']
+
+
+def load_clinic_rules():
+    """前計算済みの分院別ルールを取得（staff_rules.yamlのキャッシュ更新時のみ再構築）"""
+    global _clinic_rules_cache
+    staff_rules = load_staff_rules()
+    source, rules = _clinic_rules_cache
+    if source is staff_rules:
+        return rules
+
+    rules = _build_clinic_rules(staff_rules.get('staff_by_clinic') or {})
+    _clinic_rules_cache = (staff_rules, rules)
+    return rules
+
+
+def _result_validators(result_path):
+    """スタッフルール・分院設定を反映する結果レスポンス用のETag/Last-Modified"""
+    config_path = current_app.config['CONFIG_PATH']
+    return _cache_validators(
+        result_path,
+        os.path.join(config_path, 'staff_rules.yaml'),
+        os.path.join(config_path, 'clinics.yaml'),
+    )
+
+
 def load_clinics_settings():
-    """clinics.yamlのsettingsを読み込む"""
+    """clinics.yamlのsettingsを読み込む（返り値は共有キャッシュのため変更しないこと）"""
     config_path = current_app.config['CONFIG_PATH']
     clinics_path = os.path.join(config_path, 'clinics.yaml')
 
-    if not os.path.exists(clinics_path):
+    try:
+        config = load_yaml_cached(clinics_path) or {}
+    except FileNotFoundError:
         return {}
-
-    with open(clinics_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f) or {}
     return config.get('settings', {})
 
 
-def apply_web_booking_filter(data, staff_rules, settings=None):
+def _filter_result_web_booking(result, web_booking_set, min_blocks):
+    """1分院の結果をweb_bookingで絞り込み、合計と判定を再計算
+
+    web_booking未設定なら結果をクリアしてFalseを返す。
+    """
+    if not web_booking_set:
+        # web_booking未設定 → 結果をクリア（WEBタグ未設定 = 集計対象外）
+        result['details'] = []
+        result['total_30min_blocks'] = 0
+        result['result'] = False
+        return False
+
+    # web_bookingリストのスタッフのみに絞る
+    filtered_details = [
+        d for d in result.get('details', [])
+        if (name := d.get('doctor', '')) in web_booking_set or _strip_suffix(name) in web_booking_set
+    ]
+    result['details'] = filtered_details
+
+    # 合計と判定を再計算
+    total = sum([d.get('blocks', 0) for d in filtered_details])
+    result['total_30min_blocks'] = total
+    result['result'] = total >= min_blocks
+    return True
+
+
+def apply_web_booking_filter(data, clinic_rules, settings=None):
     """web_bookingリストに基づいて結果をフィルタリング
 
     web_bookingが設定されている分院は、WEB予約受付スタッフのみ表示。
     未設定の分院は従来通り全スタッフ表示。
+    clinic_rulesはload_clinic_rules()の前計算結果。
     """
-    staff_by_clinic = staff_rules.get('staff_by_clinic', {})
     min_blocks = (settings or {}).get('minimum_blocks_required', 4)
 
     has_filter = False
@@ -59,39 +229,12 @@ def apply_web_booking_filter(data, staff_rules, settings=None):
 
     for result in data.get('results', []):
         clinic_name = result.get('clinic', '')
-        clinic_config = staff_by_clinic.get(clinic_name, {})
-        web_booking = clinic_config.get('web_booking', [])
-
-        if not web_booking:
-            # web_booking未設定 → 結果をクリア（WEBタグ未設定 = 集計対象外）
-            result['details'] = []
-            result['total_30min_blocks'] = 0
-            result['result'] = False
-            continue
-
-        has_filter = True
-        web_booking_set = set(web_booking)
-
-        # web_bookingリストのスタッフのみに絞る
-        # Stransa のスタッフ名は (1), (2) サフィックス付きの場合がある
-        import re
-        def _strip_suffix(name):
-            return re.sub(r'\(\d+\)$', '', name).strip()
-        filtered_details = [
-            d for d in result.get('details', [])
-            if d.get('doctor', '') in web_booking_set or _strip_suffix(d.get('doctor', '')) in web_booking_set
-        ]
-        result['details'] = filtered_details
-
-        # 合計を再計算
-        total = sum(d.get('blocks', 0) for d in filtered_details)
-        result['total_30min_blocks'] = total
+        web_booking_set = clinic_rules.get(clinic_name, _EMPTY_CLINIC_RULES)['web_booking']
 
-        # 判定を再計算
-        result['result'] = total >= min_blocks
-
-        if result['result']:
-            clinics_with_availability += 1
+        if _filter_result_web_booking(result, web_booking_set, min_blocks):
+            has_filter = True
+            if result['result']:
+                clinics_with_availability += 1
 
     # サマリーを再計算
     if has_filter and 'summary' in data:
@@ -100,47 +243,141 @@ def apply_web_booking_filter(data, staff_rules, settings=None):
     return data
 
 
-def _recalculate_detail(detail, threshold):
-    """raw_slot_timesがあれば指定閾値で枠数を再計算"""
-    raw_times = detail.get('raw_slot_times')
-    if not raw_times:
-        return
-    interval = detail.get('slot_interval', 5)
-    consec = threshold // interval
-    detail['blocks'] = count_30min_blocks(raw_times, interval, consec)
-    _, ranges = count_consecutive_blocks(raw_times, consec, interval)
-    detail['times'] = [format_time_range(s, e, interval) for s, e in ranges]
-    detail['threshold_minutes'] = threshold
+_output_synced = False
 
+# GCS→output同期は起動時からバックグラウンドで実行し、呼び出し側は同じFutureを待つ
+# （同期の二重実行を防ぎ、最新ファイルのダウンロード完了前に古い結果を返さない）
+_sync_executor = ThreadPoolExecutor(max_workers=1)
+_sync_future = None
+_sync_start_lock = threading.Lock()
+_SYNC_WAIT_TIMEOUT = 60  # 結果APIが同期完了を待つ上限（秒）
 
-_output_synced = False
+
+def _start_output_sync(output_path):
+    """GCSからのoutput同期を開始（実行中なら既存のFutureを返す）"""
+    global _sync_future
+    with _sync_start_lock:
+        if _sync_future is None or _sync_future.done():
+            _sync_future = _sync_executor.submit(sync_output_from_gcs, output_path)
+        return _sync_future
+
+
+@bp.record_once
+def _start_output_sync_on_register(state):
+    """Blueprint登録時（アプリ起動時）にGCS同期を開始"""
+    global _output_synced
+    _start_output_sync(state.app.config['OUTPUT_PATH'])
+    _output_synced = True
 
 
 def _sort_results_by_clinic_order(data):
-    """結果をCLINIC_ORDERの順序でソート"""
-    from web.routes.staff import CLINIC_ORDER
-    order_map = {name: i for i, name in enumerate(CLINIC_ORDER)}
-    if 'results' in data:
-        data['results'].sort(
-            key=lambda r: order_map.get(r.get('clinic', ''), 999)
-        )
+    """結果をCLINIC_ORDERの順序でソートした新しいdictを返す（元データは変更しない）"""
+    from web.routes.staff import CLINIC_RANK
+    if 'results' not in data:
+        return data
+    return {**data, 'results': sorted(
+        data['results'],
+        key=lambda r: CLINIC_RANK.get(r.get('clinic', ''), 999)
+    )}
 
 
-def _merge_missing_systems(new_results, systems_present, output_path_str, check_date):
-    """欠落システムの結果を前回ファイルから補完"""
-    import glob as _glob
+# パース済み結果JSONのキャッシュ: path -> ((mtime_ns, size), data)
+_result_json_cache = {}
+_result_json_lock = threading.Lock()
+_RESULT_JSON_CACHE_MAX = 8
 
-    date_str = check_date.replace('-', '')
-    pattern = os.path.join(output_path_str, f'slot_check_{date_str}_*.json')
-    files = _glob.glob(pattern)
 
-    if not files:
+def _load_json_cached(path):
+    """結果JSONを読み込む（mtime/サイズ不変ならパース済みデータを再利用）
+
+    返り値はキャッシュ共有オブジェクトのため変更しないこと。
+    変更する場合は _copy_result_data() でコピーしてから使う。
+    """
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _result_json_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path, 'rb') as f:
+        data = orjson.loads(f.read())
+
+    with _result_json_lock:
+        if path not in _result_json_cache and len(_result_json_cache) >= _RESULT_JSON_CACHE_MAX:
+            # 最も古く登録されたエントリを破棄
+            del _result_json_cache[next(iter(_result_json_cache))]
+        _result_json_cache[path] = (key, data)
+    return data
+
+
+# /<date> のシリアライズ済みレスポンス: path -> ((mtime_ns, size), body)
+_result_body_cache = {}
+
+
+def _sorted_result_body(path):
+    """CLINIC_ORDER順に並べ替えた結果JSONのバイト列を取得（ファイル不変なら再利用）
+
+    結果ファイルはクリニック順が保証されないため生ファイルをそのまま返せない。
+    並べ替え＋シリアライズ済みのバイト列をキャッシュし、2回目以降はパースも
+    シリアライズもせずに返す。
+    """
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _result_body_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    body = orjson.dumps(_sort_results_by_clinic_order(_load_json_cached(path)))
+
+    with _result_json_lock:
+        if path not in _result_body_cache and len(_result_body_cache) >= _RESULT_JSON_CACHE_MAX:
+            del _result_body_cache[next(iter(_result_body_cache))]
+        _result_body_cache[path] = (key, body)
+    return body
+
+
+def _copy_result(result):
+    """1分院の結果を変更用にコピー（result/detailのdictのみ複製）"""
+    return {**result, 'details': [dict(d) for d in result.get('details', [])]}
+
+
+def _copy_result_data(data):
+    """キャッシュ済み結果を変更用にコピー（result/detailのdictのみ複製し、時刻リスト等は共有）"""
+    copied = dict(data)
+    copied['results'] = [_copy_result(r) for r in data.get('results', [])]
+    if 'summary' in data:
+        copied['summary'] = dict(data['summary'])
+    return copied
+
+
+def _latest_file_for_date(output_path, date_str):
+    """指定対象日 (YYYYMMDD) の最新結果ファイルのパスを返す（なければNone）
+
+    ファイル名末尾の実行日時 (YYYYMMDD_HHMMSS) で判定するためstatは不要。
+    """
+    prefix = f'slot_check_{date_str}_'
+    latest = None
+    latest_name = ''
+    try:
+        with os.scandir(output_path) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith(prefix) and name.endswith('.json') and name > latest_name:
+                    latest_name, latest = name, entry.path
+    except OSError:
+        pass
+    return latest
+
+
+def _merge_missing_systems(new_results, systems_present, output_path_str, check_date):
+    """欠落システムの結果を前回ファイルから補完"""
+    latest = _latest_file_for_date(output_path_str, check_date.replace('-', ''))
+    if latest is None:
         return None
 
-    latest = max(files, key=os.path.getmtime)
     try:
-        with open(latest, 'r', encoding='utf-8') as f:
-            prev_data = json.load(f)
+        # 共有キャッシュ（読み取り専用、保存・通知側はコピーして使う）
+        prev_data = _load_json_cached(latest)
     except Exception:
         return None
 
@@ -156,37 +393,91 @@ def _merge_missing_systems(new_results, systems_present, output_path_str, check_
     return {'results': new_results + missing}
 
 
-def get_result_files():
-    """結果ファイルのリストを取得"""
-    global _output_synced
-    output_path = current_app.config['OUTPUT_PATH']
-
-    # Cloud Run起動時にGCSからoutputファイルを同期（初回のみ）
-    if not _output_synced:
-        sync_output_from_gcs(output_path)
-        _output_synced = True
+# 結果ファイル一覧のキャッシュ（outputディレクトリの (mtime_ns, size) で無効化）
+# etag/last_modified は /list 用（一覧と同じstatから作るため内容と必ず一致する）
+_EMPTY_FILES_CACHE = {'key': None, 'files': [], 'list_body': b'[]', 'etag': None, 'last_modified': 0}
+_files_cache = _EMPTY_FILES_CACHE
 
-    json_files = glob.glob(os.path.join(output_path, 'slot_check_*.json'))
 
+def _scan_result_files(output_path):
+    """outputディレクトリを走査して結果ファイル一覧を作成（ディレクトリ不変ならキャッシュを返す）"""
+    global _files_cache
+    try:
+        st = os.stat(output_path)
+    except OSError:
+        return _EMPTY_FILES_CACHE
+    key = (st.st_mtime_ns, st.st_size)
+    if key == _files_cache['key']:
+        return _files_cache
+
+    # scandirはファイル名をディレクトリ走査から直接取得（glob+basenameより軽量）
     files = []
-    for f in json_files:
-        basename = os.path.basename(f)
-        # slot_check_YYYYMMDD_YYYYMMDD_HHMMSS.json から日付を抽出
-        parts = basename.replace('.json', '').split('_')
-        if len(parts) >= 5:
-            check_date = parts[2]  # YYYYMMDD (対象日)
-            run_date = parts[3]    # YYYYMMDD (実行日)
-            run_time = parts[4]    # HHMMSS (実行時刻)
+    with os.scandir(output_path) as it:
+        for entry in it:
+            name = entry.name
+            groups = _parse_result_filename(name)
+            if groups is None:
+                continue
+            check_date = groups[0]
             files.append({
-                'filename': basename,
+                'filename': name,
                 'check_date': f"{check_date[:4]}-{check_date[4:6]}-{check_date[6:8]}",
-                'path': f,
-                'sort_key': f"{check_date}_{run_date}_{run_time}"  # ソート用キー
+                'path': entry.path,
             })
 
     # 日付+時刻順でソート（新しい順）
-    files.sort(key=lambda x: x['sort_key'], reverse=True)
-    return files
+    # 固定長・ゼロ埋めの形式のみ通しているためファイル名順 = 対象日→実行日時順
+    files.sort(key=lambda x: x['filename'], reverse=True)
+
+    # /list のレスポンスはシリアライズ済みで保持
+    list_body = orjson.dumps(
+        [{'filename': f['filename'], 'check_date': f['check_date']} for f in files]
+    )
+
+    _files_cache = {
+        'key': key,
+        'files': files,
+        'list_body': list_body,
+        'etag': f'{key[0]:x}-{key[1]:x}',
+        'last_modified': st.st_mtime,
+    }
+    return _files_cache
+
+
+def _invalidate_result_files():
+    """チェック完了後に呼ぶ: 次回アクセス時にGCS再同期と一覧の再走査を行う
+
+    既存ファイルの上書きではディレクトリのmtimeが変わらないため明示的に破棄する。
+    """
+    global _output_synced, _files_cache
+    _output_synced = False
+    _files_cache = _EMPTY_FILES_CACHE
+
+
+def _get_result_files_cache():
+    """GCS同期を考慮して結果ファイル一覧のキャッシュを取得"""
+    global _output_synced
+    output_path = current_app.config['OUTPUT_PATH']
+
+    # Cloud Run起動時にGCSからoutputファイルを同期（バックグラウンド）
+    if not _output_synced:
+        _start_output_sync(output_path)
+        _output_synced = True
+
+    # 同期中なら完了を待つ（GCSは名前順に返すため最新の結果ほど後に届く）
+    future = _sync_future
+    if future is not None and not future.done():
+        try:
+            future.result(timeout=_SYNC_WAIT_TIMEOUT)
+        except Exception:
+            pass
+
+    return _scan_result_files(output_path)
+
+
+def get_result_files():
+    """結果ファイルのリストを取得（新しい順、返り値は共有キャッシュのため変更しないこと）"""
+    return _get_result_files_cache()['files']
 
 
 @bp.route('/', methods=['GET'])
@@ -195,32 +486,43 @@ def get_latest_result():
     files = get_result_files()
 
     if not files:
-        return jsonify({'error': 'No results found'}), 404
+        return json_response({'error': 'No results found'}, 404)
 
     latest = files[0]
 
+    # 結果ファイル・staff_rules.yaml・clinics.yamlのいずれかが変われば内容が変わる
+    etag, last_modified = _result_validators(latest['path'])
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
     try:
-        with open(latest['path'], 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = _copy_result_data(_load_json_cached(latest['path']))
 
         # WEB予約受付フィルタを適用
-        staff_rules = load_staff_rules()
         settings = load_clinics_settings()
-        data = apply_web_booking_filter(data, staff_rules, settings)
+        data = apply_web_booking_filter(data, load_clinic_rules(), settings)
 
         # CLINIC_ORDER順にソート
-        _sort_results_by_clinic_order(data)
+        data = _sort_results_by_clinic_order(data)
 
-        return jsonify(data)
+        return json_response(data, etag=etag, last_modified=last_modified)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 
 @bp.route('/list', methods=['GET'])
 def get_result_list():
     """結果ファイルのリストを取得"""
-    files = get_result_files()
-    return jsonify([{'filename': f['filename'], 'check_date': f['check_date']} for f in files])
+    # シリアライズ済みのバイト列とETagをキャッシュからそのまま返す
+    cache = _get_result_files_cache()
+    etag = cache['etag']
+    if etag is None:
+        return json_response(cache['list_body'])
+    not_modified = _not_modified(etag, cache['last_modified'])
+    if not_modified is not None:
+        return not_modified
+    return json_response(cache['list_body'], etag=etag, last_modified=cache['last_modified'])
 
 
 @bp.route('/<date>', methods=['GET'])
@@ -230,22 +532,22 @@ def get_result_by_date(date):
     date_str = date.replace('-', '')
 
     output_path = current_app.config['OUTPUT_PATH']
-    pattern = os.path.join(output_path, f'slot_check_{date_str}_*.json')
-    files = glob.glob(pattern)
-
-    if not files:
-        return jsonify({'error': f'No results found for {date}'}), 404
 
     # 最新のファイル（同じ日付で複数ある場合）
-    latest = max(files, key=os.path.getmtime)
+    latest = _latest_file_for_date(output_path, date_str)
+
+    if latest is None:
+        return json_response({'error': f'No results found for {date}'}, 404)
+
+    etag, last_modified = _cache_validators(latest)
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
 
     try:
-        with open(latest, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        _sort_results_by_clinic_order(data)
-        return jsonify(data)
+        return json_response(_sorted_result_body(latest), etag=etag, last_modified=last_modified)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 
 @bp.route('/with-categories', methods=['GET'])
@@ -254,105 +556,162 @@ def get_result_with_categories():
     files = get_result_files()
 
     if not files:
-        return jsonify({'error': 'No results found'}), 404
+        return json_response({'error': 'No results found'}, 404)
 
     latest = files[0]
 
+    etag, last_modified = _result_validators(latest['path'])
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    # 読み込み・分類のエラーはストリーム開始前に500で返す（ストリームはシリアライズのみ）
     try:
-        with open(latest['path'], 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = _load_json_cached(latest['path'])
+        clinic_rules = load_clinic_rules()
+        min_blocks = load_clinics_settings().get('minimum_blocks_required', 4)
+        results, summary = _categorize_results(data, clinic_rules, min_blocks)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
 
-        # スタッフ分類を読み込み
-        staff_rules = load_staff_rules()
-        staff_by_clinic = staff_rules.get('staff_by_clinic', {})
+    response = Response(
+        _stream_categorized_result(data, results, summary),
+        mimetype='application/json',
+    )
+    return with_validators(response, etag, last_modified)
 
-        # 結果に職種別集計を追加
-        for result in data.get('results', []):
-            clinic_name = result.get('clinic', '')
-            clinic_config = staff_by_clinic.get(clinic_name, {})
-
-            doctors = set(clinic_config.get('doctors', []))
-            hygienists = set(clinic_config.get('hygienists', []))
-            orthodontists = set(clinic_config.get('orthodontists', []))
-            memos = clinic_config.get('memos', {})
-            thresholds = clinic_config.get('slot_threshold', {})
-            dr_threshold = thresholds.get('doctor', 30)
-            dh_threshold = thresholds.get('hygienist', 30)
-            ortho_threshold = thresholds.get('orthodontist', 30)
-
-            doctor_blocks = 0
-            hygienist_blocks = 0
-            orthodontist_blocks = 0
-            other_blocks = 0
-
-            # Stransa (1)/(2) サフィックス除去用
-            import re
-            def _strip_suffix(name):
-                return re.sub(r'\(\d+\)$', '', name).strip()
 
-            for detail in result.get('details', []):
-                staff_name = detail.get('doctor', '')
-                base_name = _strip_suffix(staff_name)
+def _categorize_result(result, rules, min_blocks):
+    """1分院の結果に職種分類・閾値再計算・メモ・職種別集計を付与し、
+    同じ走査でWEB予約受付フィルタ（_filter_result_web_booking相当）も適用する
 
-                # 職種分類と再計算（矯正が最優先）
-                if staff_name in orthodontists or base_name in orthodontists:
-                    detail['category'] = 'orthodontist'
-                    _recalculate_detail(detail, ortho_threshold)
-                    detail.setdefault('threshold_minutes', ortho_threshold)
-                elif staff_name in doctors or base_name in doctors:
-                    detail['category'] = 'doctor'
-                    _recalculate_detail(detail, dr_threshold)
-                    detail.setdefault('threshold_minutes', dr_threshold)
-                elif staff_name in hygienists or base_name in hygienists:
-                    detail['category'] = 'hygienist'
-                    _recalculate_detail(detail, dh_threshold)
-                    detail.setdefault('threshold_minutes', dh_threshold)
-                else:
-                    detail['category'] = 'unknown'
-                    _recalculate_detail(detail, 30)
-                    detail.setdefault('threshold_minutes', 30)
-
-                blocks = detail.get('blocks', 0)
-                if detail['category'] == 'doctor':
-                    doctor_blocks += blocks
-                elif detail['category'] == 'hygienist':
-                    hygienist_blocks += blocks
-                elif detail['category'] == 'orthodontist':
-                    orthodontist_blocks += blocks
-                else:
-                    other_blocks += blocks
+    category_summaryはフィルタ前の全スタッフで集計する。web_booking設定ありならTrue。
+    """
+    category_get = rules['category_map'].get
+    category_thresholds = rules['category_thresholds']
+    memos_get = rules['memos'].get
+    web_booking_set = rules['web_booking']
+    recalculate = recalculate_detail
+    strip_suffix = _strip_suffix
+    priority = _CATEGORY_PRIORITY
+
+    # 職種 -> 空き枠数（category_thresholdsと同じキー: doctor/hygienist/orthodontist/unknown）
+    totals = dict.fromkeys(category_thresholds, 0)
+    # web_booking未設定の分院は全スタッフ除外（WEBタグ未設定 = 集計対象外）
+    filtered_details = []
+    filtered_total = 0
+
+    for detail in result.get('details', []):
+        staff_name = detail.get('doctor', '')
+        base_name = strip_suffix(staff_name)
+
+        # 職種分類と閾値（完全一致・サフィックス除去名のうち優先度の高い職種）
+        category = category_get(staff_name, 'unknown')
+        if base_name != staff_name:
+            base_category = category_get(base_name, 'unknown')
+            if priority[base_category] > priority[category]:
+                category = base_category
+        threshold = category_thresholds[category]
+
+        detail['category'] = category
+        recalculate(detail, threshold)
+        detail.setdefault('threshold_minutes', threshold)
+
+        blocks = detail.get('blocks', 0)
+        totals[category] += blocks
+
+        # web_bookingリストのスタッフのみ残す（メモも残すスタッフのみ付与）
+        if staff_name in web_booking_set or base_name in web_booking_set:
+            detail['memo'] = memos_get(staff_name, '') or memos_get(base_name, '')
+            filtered_details.append(detail)
+            filtered_total += blocks
+
+    # 職種別集計を追加
+    result['category_summary'] = {
+        'doctor': totals['doctor'],
+        'hygienist': totals['hygienist'],
+        'orthodontist': totals['orthodontist'],
+        'other': totals['unknown']
+    }
+    result['slot_threshold'] = {
+        'doctor': rules['dr_threshold'],
+        'hygienist': rules['dh_threshold']
+    }
+
+    result['details'] = filtered_details
+    result['total_30min_blocks'] = filtered_total
+    result['result'] = bool(web_booking_set) and filtered_total >= min_blocks
+    return bool(web_booking_set)
+
+
+def _categorize_results(data, clinic_rules, min_blocks):
+    """全分院に職種分類とWEB予約受付フィルタを適用し、(結果リスト, summary) を返す
+
+    dataはキャッシュ共有オブジェクトのため分院ごとにコピーしてから変更する。
+    summaryが無いデータではNone。
+    """
+    rules_get = clinic_rules.get
+    results = []
+    has_filter = False
+    clinics_with_availability = 0
+    for cached in data.get('results', []):
+        result = _copy_result(cached)
+        rules = rules_get(result.get('clinic', ''), _EMPTY_CLINIC_RULES)
 
-                # メモを追加
-                detail['memo'] = memos.get(staff_name, '') or memos.get(base_name, '')
+        if _categorize_result(result, rules, min_blocks):
+            has_filter = True
+            if result['result']:
+                clinics_with_availability += 1
+        results.append(result)
 
-            # 職種別集計を追加
-            result['category_summary'] = {
-                'doctor': doctor_blocks,
-                'hygienist': hygienist_blocks,
-                'orthodontist': orthodontist_blocks,
-                'other': other_blocks
-            }
-            result['slot_threshold'] = {
-                'doctor': dr_threshold,
-                'hygienist': dh_threshold
-            }
+    summary = None
+    if 'summary' in data:
+        summary = dict(data['summary'])
+        if has_filter:
+            summary['clinics_with_availability'] = clinics_with_availability
+    return results, summary
 
-        # WEB予約受付フィルタを適用（職種分類後に実行）
-        settings = load_clinics_settings()
-        data = apply_web_booking_filter(data, staff_rules, settings)
 
-        return jsonify(data)
+def _stream_categorized_result(data, results, summary):
+    """分類済みの結果を1分院ずつJSONに逐次出力（例外の起きうる処理は事前に済ませておく）"""
+    dumps = orjson.dumps
+
+    head = {k: v for k, v in data.items() if k not in ('results', 'summary')}
+    yield dumps(head)[:-1] + (b',"results":[' if head else b'"results":[')
+
+    for i, result in enumerate(results):
+        yield (b',' + dumps(result)) if i else dumps(result)
+
+    tail = b']'
+    if summary is not None:
+        tail += b',"summary":' + dumps(summary)
+    yield tail + b'}'
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+
+_LOG_TAIL_BYTES = 8192  # 末尾読み込みサイズの初期値（ログ全体は読まない）
 
 
 def _read_log_tail(log_path, lines=10):
-    """ログファイルの末尾を読む"""
+    """ログファイルの末尾を読む
+
+    末尾から_LOG_TAIL_BYTESだけ読み、行数が足りなければ範囲を倍にして読み直す。
+    """
     try:
-        with open(log_path, 'r', encoding='utf-8') as f:
-            all_lines = f.readlines()
-        return ''.join(all_lines[-lines:]).strip()
+        with open(log_path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            window = _LOG_TAIL_BYTES
+            while True:
+                start = max(0, size - window)
+                f.seek(start)
+                tail = f.read(size - start)
+                # 先頭行は途中から始まる可能性があるため改行は1つ余分に必要
+                if start == 0 or tail.count(b'\n') > lines:
+                    break
+                window *= 2
+        tail_lines = tail.decode('utf-8', 'replace').splitlines()
+        if start > 0:
+            tail_lines = tail_lines[1:]
+        return '\n'.join(tail_lines[-lines:]).strip()
     except Exception:
         return ''
 
@@ -360,17 +719,8 @@ def _read_log_tail(log_path, lines=10):
 @bp.route('/check', methods=['POST'])
 def run_check():
     """手動でチェックを実行（ブラウザプール利用のインプロセス実行）"""
-    global _check_thread, _check_started_at, _check_result, _check_error
     project_root = current_app.config['PROJECT_ROOT']
 
-    # 既に実行中なら拒否
-    if _check_thread and _check_thread.is_alive():
-        elapsed = int(time.time() - (_check_started_at or time.time()))
-        return jsonify({
-            'success': False,
-            'message': f'既にチェック実行中です（{elapsed}秒経過）'
-        }), 409
-
     # リクエストパラメータ取得
     data = request.get_json(silent=True) or {}
     system_filter = data.get('system')  # 'dent-sys', 'stransa', 'gmo', or None
@@ -381,18 +731,12 @@ def run_check():
     os.makedirs(log_dir, exist_ok=True)
     log_path = os.path.join(log_dir, 'check_latest.log')
 
-    _check_started_at = time.time()
-    _check_result = None
-    _check_error = None
-
     # 設定読み込みに必要な情報をキャプチャ
+    app = current_app._get_current_object()
     config_path = current_app.config['CONFIG_PATH']
     output_path = current_app.config['OUTPUT_PATH']
 
     def _run_check_thread():
-        global _check_result, _check_error, _output_synced
-        import logging
-
         # ファイルハンドラでログを check_latest.log に出力
         file_handler = logging.FileHandler(log_path, mode='w', encoding='utf-8')
         file_handler.setFormatter(logging.Formatter(
@@ -409,13 +753,8 @@ def run_check():
         root_logger.setLevel(logging.INFO)
 
         try:
-            import asyncio as _asyncio
-            from src.browser_pool import get_browser, run_async
-            from src.config_loader import load_config, get_exclude_patterns, get_slot_settings
+            # src.main はスクレイパー経由でplaywrightを読み込むため実行時にインポート
             from src.main import analyze_results
-            from src.output_writer import save_results
-            from pathlib import Path
-            from datetime import datetime, timedelta, timezone
 
             logger_t = logging.getLogger('check_thread')
             logger_t.info("インプロセスチェック開始")
@@ -431,14 +770,9 @@ def run_check():
                 'slot_interval_minutes': config['settings'].get('slot_interval_minutes', 5),
             }
 
-            # staff_rules
-            import yaml
-            sr_path = Path(config_path) / 'staff_rules.yaml'
-            staff_by_clinic = {}
-            if sr_path.exists():
-                with open(sr_path, 'r', encoding='utf-8') as f:
-                    sr_data = yaml.safe_load(f) or {}
-                staff_by_clinic = sr_data.get('staff_by_clinic', {})
+            # staff_rules（API側と共通のキャッシュ、読み取り専用で使用）
+            with app.app_context():
+                staff_by_clinic = load_staff_rules().get('staff_by_clinic', {})
 
             dent_sys_clinics = [c for c in config.get('dent_sys_clinics', []) if c.get('enabled', True)]
             stransa_clinics = [c for c in config.get('stransa_clinics', []) if c.get('enabled', True)]
@@ -569,12 +903,10 @@ def run_check():
                 logger_t.info(f"{label}完了: {analysis['summary']}")
 
             # 欠落システムの結果を前回ファイルから補完
-            JST = timezone(timedelta(hours=9))
             check_date = (datetime.now(JST) + timedelta(days=1)).strftime('%Y-%m-%d')
 
-            # マージ前にGCS同期（Cloud Run再起動時の空ディレクトリ対策）
-            from src.gcs_helper import sync_output_from_gcs
-            sync_output_from_gcs(output_path)
+            # マージ前にGCS同期（Cloud Run再起動時の空ディレクトリ対策、実行中の同期があれば合流）
+            _start_output_sync(output_path).result()
 
             systems_in_results = set(r.get('system') for r in all_results)
             missing_systems = {'dent-sys', 'stransa', 'gmo', 'plum'} - systems_in_results
@@ -614,27 +946,40 @@ def run_check():
                 except Exception as e:
                     logger_t.error(f"Chatwork通知エラー: {e}")
 
-            _check_result = True
-            _output_synced = False
+            _invalidate_result_files()
+            with _check_lock:
+                _check_state.result = True
             logger_t.info("チェック完了")
 
         except Exception as e:
-            _check_result = False
-            _check_error = str(e)
+            with _check_lock:
+                _check_state.result = False
+                _check_state.error = str(e)
             logging.getLogger('check_thread').error(f"チェック失敗: {e}")
-            import traceback
             traceback.print_exc()
         finally:
             root_logger.removeHandler(file_handler)
             root_logger.removeHandler(stream_handler)
             file_handler.close()
 
-    import threading
-    _check_thread = threading.Thread(target=_run_check_thread, daemon=True)
-    _check_thread.start()
+    # 実行中判定とスレッド開始をまとめて行い、同時リクエストによる二重起動を防ぐ
+    now = time.time()
+    with _check_lock:
+        if _check_state.thread and _check_state.thread.is_alive():
+            elapsed = int(now - (_check_state.started_at or now))
+            return json_response({
+                'success': False,
+                'message': f'既にチェック実行中です（{elapsed}秒経過）'
+            }, 409)
+
+        _check_state.started_at = now
+        _check_state.result = None
+        _check_state.error = None
+        _check_state.thread = threading.Thread(target=_run_check_thread, daemon=True)
+        _check_state.thread.start()
 
     system_label = {'dent-sys': 'dent-sys', 'stransa': 'Stransa', 'gmo': 'GMO Reserve', 'plum': 'Plum', 'pay-light': 'paylight X'}.get(system_filter, '全システム')
-    return jsonify({
+    return json_response({
         'success': True,
         'message': f'{system_label}のチェックを開始しました'
     })
@@ -643,25 +988,34 @@ def run_check():
 @bp.route('/check/status', methods=['GET'])
 def check_status():
     """チェック実行状態を取得"""
-    global _check_thread
     project_root = current_app.config['PROJECT_ROOT']
     log_path = os.path.join(project_root, 'logs', 'check_latest.log')
 
-    if _check_thread is None:
-        return jsonify({
+    # 状態はロック内で一括取得（スレッドは終了前に結果を書くため、
+    # ロック内で is_alive() が False なら result は確定済み）
+    with _check_lock:
+        thread = _check_state.thread
+        started_at = _check_state.started_at
+        result = _check_state.result
+        error = _check_state.error
+        running = thread is not None and thread.is_alive()
+
+    if thread is None:
+        return json_response({
             'running': False,
             'success': None,
             'message': 'チェック未実行',
             'elapsed': 0,
         })
 
-    elapsed = int(time.time() - (_check_started_at or time.time()))
+    now = time.time()
+    elapsed = int(now - (started_at or now))
 
-    if _check_thread.is_alive():
+    if running:
         # タイムアウトチェック
         if elapsed > _CHECK_TIMEOUT:
             log_tail = _read_log_tail(log_path, 10)
-            return jsonify({
+            return json_response({
                 'running': False,
                 'success': False,
                 'message': f'タイムアウト ({_CHECK_TIMEOUT}秒)',
@@ -670,7 +1024,7 @@ def check_status():
             })
         # まだ実行中
         log_tail = _read_log_tail(log_path, 3)
-        return jsonify({
+        return json_response({
             'running': True,
             'success': None,
             'message': 'チェック実行中...',
@@ -679,19 +1033,18 @@ def check_status():
         })
 
     # 完了
-    global _output_synced
-    _output_synced = False
+    _invalidate_result_files()
 
-    if _check_result:
-        return jsonify({
+    if result:
+        return json_response({
             'running': False,
             'success': True,
             'message': 'チェック完了',
             'elapsed': elapsed,
         })
     else:
-        error_detail = _check_error or _read_log_tail(log_path, 15)
-        return jsonify({
+        error_detail = error or _read_log_tail(log_path, 15)
+        return json_response({
             'running': False,
             'success': False,
             'message': 'チェック失敗',
@@ -702,9 +1055,7 @@ def check_status():
 
 def _calc_business_days(year: int, month: int, closed_days: list, closed_weekday_nth: dict = None) -> int:
     """指定月の診療日数を算出（休診曜日・祝日を除外）"""
-    import calendar
     import jpholiday
-    from datetime import date
 
     weekday_map = {"月": 0, "火": 1, "水": 2, "木": 3, "金": 4, "土": 5, "日": 6}
     closed_weekdays = set()
@@ -744,10 +1095,10 @@ def _load_clinic_closed_days() -> dict:
     """clinics.yamlから全分院の休診日設定を読み込む"""
     config_path = current_app.config['CONFIG_PATH']
     clinics_path = os.path.join(config_path, 'clinics.yaml')
-    if not os.path.exists(clinics_path):
+    try:
+        config = load_yaml_cached(clinics_path) or {}
+    except FileNotFoundError:
         return {}
-    with open(clinics_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f) or {}
 
     result = {}
     for key in ['clinics', 'stransa_clinics', 'gmo_clinics', 'plum_clinics']:
@@ -764,57 +1115,56 @@ def _load_clinic_closed_days() -> dict:
 @bp.route('/monthly-report', methods=['GET'])
 def monthly_report_api():
     """月次レポートAPI: 指定月の分院別空き枠集計"""
-    import re as _re
-    from datetime import datetime
-
     month = request.args.get('month')
-    if not month or not _re.match(r'^\d{4}-\d{2}$', month):
+    if not month or not re.match(r'^\d{4}-\d{2}$', month):
         month = datetime.now().strftime('%Y-%m')
 
     year_month = month.replace('-', '')  # YYYYMM
     year_int = int(year_month[:4])
     month_int = int(year_month[4:6])
 
-    # GCS同期（Cloud Run用）
+    # GCS同期（Cloud Run用、実行中の同期があれば合流）
     output_path = current_app.config['OUTPUT_PATH']
-    sync_output_from_gcs(output_path)
+    _start_output_sync(output_path).result()
 
-    # 該当月のJSONファイルを取得
-    pattern = os.path.join(output_path, f'slot_check_{year_month}*.json')
-    json_files = sorted(glob.glob(pattern))
+    # 該当月の結果ファイルを取得（一覧はファイル名の新しい順）
+    month_files = [
+        f for f in _scan_result_files(output_path)['files']
+        if f['check_date'].startswith(month)
+    ]
 
-    if not json_files:
-        return jsonify({'month': month, 'clinics': [], 'total_days_checked': 0})
+    if not month_files:
+        return json_response({'month': month, 'clinics': [], 'total_days_checked': 0})
 
     # 休診日設定を読み込み
     clinic_closed = _load_clinic_closed_days()
 
-    # staff_rules読み込み（Dr/DH分類用）
-    staff_rules_data = load_staff_rules()
-    staff_by_clinic = staff_rules_data.get('staff_by_clinic', {})
+    # staff_rules読み込み（Dr/DH分類用、前計算済み）
+    clinic_rules = load_clinic_rules()
     settings = load_clinics_settings()
     min_blocks = settings.get('minimum_blocks_required', 4)
 
     # 同じcheck_dateのファイルが複数ある場合、最新のみ使う
+    # ファイル名（対象日_実行日_時刻）の新しい順に見て、日付ごとに最初に読めたものを採用する
+    # （古い実行分はパースしない。最新が壊れていれば次に新しいものを使う）
     date_to_file = {}
-    for filepath in json_files:
+    for f in month_files:
+        if f['check_date'] in date_to_file:
+            continue
+        filepath = f['path']
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            check_date = data.get('check_date', '')
-            if check_date:
-                date_to_file[check_date] = (filepath, data)
+            with open(filepath, 'rb') as fp:
+                data = orjson.loads(fp.read())
         except Exception:
             continue
+        if data.get('check_date', ''):
+            date_to_file[f['check_date']] = (filepath, data)
 
     # 分院別集計
     clinic_data = {}
     checked_dates = set()
 
-    def _strip_suffix(name):
-        return _re.sub(r'\(\d+\)$', '', name).strip()
-
-    for filepath, data in date_to_file.values():
+    for _, (filepath, data) in sorted(date_to_file.items()):
         check_date = data.get('check_date', '')
         checked_dates.add(check_date)
 
@@ -824,17 +1174,15 @@ def monthly_report_api():
                 continue
 
             # web_bookingフィルタ適用
-            clinic_config = staff_by_clinic.get(clinic_name, {})
-            web_booking = clinic_config.get('web_booking', [])
-            doctors_set = set(clinic_config.get('doctors', []))
-            hygienists_set = set(clinic_config.get('hygienists', []))
-            thresholds = clinic_config.get('slot_threshold', {})
-            dr_threshold = thresholds.get('doctor', 30)
-            dh_threshold = thresholds.get('hygienist', 30)
-
-            if not web_booking:
+            rules = clinic_rules.get(clinic_name, _EMPTY_CLINIC_RULES)
+            web_booking_set = rules['web_booking']
+            doctors_set = rules['doctors']
+            hygienists_set = rules['hygienists']
+            dr_threshold = rules['dr_threshold']
+            dh_threshold = rules['dh_threshold']
+
+            if not web_booking_set:
                 continue
-            web_booking_set = set(web_booking)
 
             # フィルタ済みスタッフの集計
             dr_blocks_day = 0
@@ -898,8 +1246,7 @@ def monthly_report_api():
     total_days = len(checked_dates)
 
     # CLINIC_ORDER順にソート
-    from web.routes.staff import CLINIC_ORDER
-    order_map = {name: i for i, name in enumerate(CLINIC_ORDER)}
+    from web.routes.staff import CLINIC_RANK
 
     clinics = []
     for cd in clinic_data.values():
@@ -917,9 +1264,9 @@ def monthly_report_api():
         del cd['daily_detail']
         clinics.append(cd)
 
-    clinics.sort(key=lambda c: order_map.get(c['clinic'], 999))
+    clinics.sort(key=lambda c: CLINIC_RANK.get(c['clinic'], 999))
 
-    return jsonify({
+    return json_response({
         'month': month,
         'total_days_checked': total_days,
         'clinics': clinics,
@@ -929,28 +1276,26 @@ def monthly_report_api():
 @bp.route('/check/test-connectivity', methods=['GET'])
 def test_connectivity():
     """Stransa サイトへの接続テスト（urllib + Playwright）"""
-    import urllib.request
-    import ssl
-    import asyncio
-
     urls = [
         'https://apo-toolboxes.stransa.co.jp/',
         'https://user.stransa.co.jp/login',
         'https://www.google.com/',
     ]
     results = {'urllib': {}, 'playwright': {}}
-    ctx = ssl.create_default_context()
 
-    # urllib テスト
-    for url in urls:
+    def probe(url):
         try:
             req = urllib.request.Request(url, headers={
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0'
             })
-            resp = urllib.request.urlopen(req, timeout=15, context=ctx)
-            results['urllib'][url] = {'status': resp.status, 'ok': True}
+            resp = urllib.request.urlopen(req, timeout=15, context=_SSL_CONTEXT)
+            return {'status': resp.status, 'ok': True}
         except Exception as e:
-            results['urllib'][url] = {'error': str(e), 'ok': False}
+            return {'error': str(e), 'ok': False}
+
+    # urllib テスト（URLごとに独立なので並列実行）
+    with ThreadPoolExecutor(max_workers=len(urls)) as ex:
+        results['urllib'] = dict(zip(urls, ex.map(probe, urls)))
 
     # Playwright テスト（google.comのみ、軽量に）
     async def test_playwright():
@@ -962,16 +1307,23 @@ def test_connectivity():
                     headless=True,
                     args=['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu']
                 )
-                page = await browser.new_page()
-                for url in ['https://www.google.com/', 'https://apo-toolboxes.stransa.co.jp/']:
+
+                async def goto(url):
+                    # URLごとに別ページを使い並列に遷移
+                    page = await browser.new_page()
                     try:
                         resp = await page.goto(url, wait_until='commit', timeout=30000)
-                        pw_results[url] = {
+                        return {
                             'status': resp.status if resp else None,
                             'ok': True
                         }
                     except Exception as e:
-                        pw_results[url] = {'error': str(e)[:200], 'ok': False}
+                        return {'error': str(e)[:200], 'ok': False}
+                    finally:
+                        await page.close()
+
+                pw_urls = ['https://www.google.com/', 'https://apo-toolboxes.stransa.co.jp/']
+                pw_results.update(zip(pw_urls, await asyncio.gather(*map(goto, pw_urls))))
                 await browser.close()
         except Exception as e:
             pw_results['_error'] = str(e)[:200]
@@ -982,7 +1334,17 @@ def test_connectivity():
     except Exception as e:
         results['playwright'] = {'_error': str(e)[:200]}
 
-    return jsonify(results)
+    return json_response(results)
+
+
+_FILE_CHUNK_BYTES = 65536
+
+
+def _iter_file_chunks(f):
+    """開いたファイルをチャンク単位で返し、終了時に閉じる"""
+    with f:
+        while chunk := f.read(_FILE_CHUNK_BYTES):
+            yield chunk
 
 
 @bp.route('/check/log', methods=['GET'])
@@ -991,12 +1353,14 @@ def check_log():
     project_root = current_app.config['PROJECT_ROOT']
     log_path = os.path.join(project_root, 'logs', 'check_latest.log')
 
-    if not os.path.exists(log_path):
+    try:
+        f = open(log_path, 'rb')
+    except FileNotFoundError:
         return 'No log file', 404, {'Content-Type': 'text/plain; charset=utf-8'}
 
-    with open(log_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    return content, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    # 全文をメモリに読み込まずチャンク単位で返す
+    # （チェック実行中は追記されるためContent-Lengthは付けない）
+    return Response(_iter_file_chunks(f), content_type='text/plain; charset=utf-8')
 
 
 @bp.route('/check/screenshots', methods=['GET'])
@@ -1006,17 +1370,16 @@ def check_screenshots():
     ss_dir = os.path.join(project_root, 'logs', 'screenshots')
 
     if not os.path.isdir(ss_dir):
-        return jsonify({'screenshots': []})
+        return json_response({'screenshots': []})
 
-    files = sorted(
-        [f for f in os.listdir(ss_dir) if f.endswith('.png')],
-        key=lambda f: os.path.getmtime(os.path.join(ss_dir, f)),
-        reverse=True
-    )
-    return jsonify({
+    # DirEntry.stat() はエントリ単位でキャッシュされるため、ソート中の stat は1回ずつ
+    with os.scandir(ss_dir) as it:
+        entries = [e for e in it if e.name.endswith('.png')]
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    return json_response({
         'screenshots': [
-            {'filename': f, 'url': f'/api/results/check/screenshots/{f}'}
-            for f in files
+            {'filename': e.name, 'url': f'/api/results/check/screenshots/{e.name}'}
+            for e in entries
         ]
     })
 
@@ -1034,4 +1397,8 @@ def check_screenshot_file(filename):
     if not os.path.exists(file_path):
         return 'Not found', 404
 
-    return send_file(file_path, mimetype='image/png')
+    # ファイル名は分院・ステップごとに固定でチェックのたびに上書きされるため、
+    # no-cacheで毎回再検証させ、変わっていなければ304を返す
+    response = send_file(file_path, mimetype='image/png', conditional=True)
+    response.cache_control.no_cache = True
+    return response
@@ -1,29 +1,47 @@
 """ルール管理API"""
 
 import os
+import copy
+import threading
 import yaml
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, request, current_app
 from src.gcs_helper import upload_to_gcs
+from src.config_loader import load_yaml_cached, invalidate_yaml_cache, write_bytes_atomic, YamlDumper
+from web.routes.responses import json_response
 
 bp = Blueprint('rules', __name__)
 
+# clinics.yaml の読み込み→変更→保存を直列化する（ルール設定・分院管理APIで共有）
+clinics_config_lock = threading.Lock()
 
-def load_clinics_config():
-    """clinics.yamlを読み込む"""
-    config_path = current_app.config['CONFIG_PATH']
-    clinics_path = os.path.join(config_path, 'clinics.yaml')
 
-    with open(clinics_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+def _clinics_path():
+    return os.path.join(current_app.config['CONFIG_PATH'], 'clinics.yaml')
+
+
+def load_clinics_config_cached():
+    """clinics.yamlを読み込む（mtime/サイズ不変ならキャッシュを返す）
+
+    返り値はキャッシュ共有オブジェクトのため変更しないこと。
+    変更する場合は load_clinics_config() を使う。
+    """
+    return load_yaml_cached(_clinics_path())
+
+
+def load_clinics_config():
+    """clinics.yamlを変更用に読み込む（キャッシュのコピーを返す）"""
+    return copy.deepcopy(load_clinics_config_cached())
 
 
 def save_clinics_config(data):
-    """clinics.yamlに保存してGCSにもアップロード"""
-    config_path = current_app.config['CONFIG_PATH']
-    clinics_path = os.path.join(config_path, 'clinics.yaml')
+    """clinics.yamlに保存してGCSにもアップロード（内容が同一なら何もしない）"""
+    clinics_path = _clinics_path()
 
-    with open(clinics_path, 'w', encoding='utf-8') as f:
-        yaml.dump(data, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+    new_bytes = yaml.dump(data, Dumper=YamlDumper, allow_unicode=True,
+                          default_flow_style=False, sort_keys=False).encode('utf-8')
+    if not write_bytes_atomic(clinics_path, new_bytes):
+        return
+    invalidate_yaml_cache(clinics_path)
 
     upload_to_gcs(clinics_path, 'config/clinics.yaml')
 
@@ -31,10 +49,10 @@ def save_clinics_config(data):
 @bp.route('/', methods=['GET'])
 def get_rules():
     """ルール設定を取得"""
-    config = load_clinics_config()
+    config = load_clinics_config_cached()
     settings = config.get('settings', {})
 
-    return jsonify({
+    return json_response({
         'consecutive_slots_required': settings.get('consecutive_slots_required', 6),
         'minimum_blocks_required': settings.get('minimum_blocks_required', 4),
         'exclude_patterns': settings.get('exclude_patterns', ['訪問']),
@@ -47,37 +65,39 @@ def get_rules():
 def update_rules():
     """ルール設定を更新"""
     data = request.get_json()
-    config = load_clinics_config()
 
-    if 'settings' not in config:
-        config['settings'] = {}
+    with clinics_config_lock:
+        config = load_clinics_config()
+
+        if 'settings' not in config:
+            config['settings'] = {}
 
-    settings = config['settings']
+        settings = config['settings']
 
-    # 各設定を更新
-    if 'consecutive_slots_required' in data:
-        settings['consecutive_slots_required'] = int(data['consecutive_slots_required'])
+        # 各設定を更新
+        if 'consecutive_slots_required' in data:
+            settings['consecutive_slots_required'] = int(data['consecutive_slots_required'])
 
-    if 'minimum_blocks_required' in data:
-        settings['minimum_blocks_required'] = int(data['minimum_blocks_required'])
+        if 'minimum_blocks_required' in data:
+            settings['minimum_blocks_required'] = int(data['minimum_blocks_required'])
 
-    if 'exclude_patterns' in data:
-        patterns = data['exclude_patterns']
-        if isinstance(patterns, str):
-            # カンマ区切りの文字列の場合
-            patterns = [p.strip() for p in patterns.split(',') if p.strip()]
-        settings['exclude_patterns'] = patterns
+        if 'exclude_patterns' in data:
+            patterns = data['exclude_patterns']
+            if isinstance(patterns, str):
+                # カンマ区切りの文字列の場合
+                patterns = [p.strip() for p in patterns.split(',') if p.strip()]
+            settings['exclude_patterns'] = patterns
 
-    if 'check_hours' in data:
-        hours = data['check_hours']
-        if 'start' in hours:
-            settings.setdefault('check_hours', {})['start'] = int(hours['start'])
-        if 'end' in hours:
-            settings.setdefault('check_hours', {})['end'] = int(hours['end'])
+        if 'check_hours' in data:
+            hours = data['check_hours']
+            if 'start' in hours:
+                settings.setdefault('check_hours', {})['start'] = int(hours['start'])
+            if 'end' in hours:
+                settings.setdefault('check_hours', {})['end'] = int(hours['end'])
 
-    if 'slot_interval_minutes' in data:
-        settings['slot_interval_minutes'] = int(data['slot_interval_minutes'])
+        if 'slot_interval_minutes' in data:
+            settings['slot_interval_minutes'] = int(data['slot_interval_minutes'])
 
-    save_clinics_config(config)
+        save_clinics_config(config)
 
-    return jsonify({'success': True, 'settings': settings})
+    return json_response({'success': True, 'settings': settings})
@@ -1,12 +1,27 @@
 """スタッフ管理API"""
 
 import os
-import json
-import glob
+import re
+import sys
+import copy
+import asyncio
+import logging
 import yaml
+import orjson
 import threading
-from flask import Blueprint, jsonify, request, current_app
+from functools import lru_cache
+from flask import Blueprint, request, current_app
+
+# プロジェクトルートをパスに追加
+_project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
 from src.gcs_helper import upload_to_gcs, download_from_gcs
+from src.config_loader import (load_yaml_cached, invalidate_yaml_cache, load_config,
+                               get_enabled_clinics, write_bytes_atomic, YamlDumper)
+from web.routes.responses import json_response
+from web.routes.rules import load_clinics_config_cached
 
 bp = Blueprint('staff', __name__)
 
@@ -37,16 +52,32 @@ CLINIC_ORDER = [
     'ヒロデンタルクリニック',   # Stransa
     'きた矯正歯科',            # Stransa（最下部）
 ]
+CLINIC_ORDER_SET = frozenset(CLINIC_ORDER)
+# 分院名 → 開院順の順位（並べ替えのキー用）
+CLINIC_RANK = {name: i for i, name in enumerate(CLINIC_ORDER)}
 
 
 _gcs_loaded = False
 
+# staff_rules.yamlが無い・空の場合の共有オブジェクト（変更しないこと）
+_EMPTY_STAFF_RULES = {'staff_by_clinic': {}}
 
-def load_staff_rules():
-    """staff_rules.yamlを読み込む（Cloud RunならGCSから取得）"""
+# 結果ファイルごとのスタッフ名: {path: ((mtime_ns, size), {分院名: set})}
+_result_staff_cache = {}
+
+
+def _staff_rules_path():
+    return os.path.join(current_app.config['CONFIG_PATH'], 'staff_rules.yaml')
+
+
+def load_staff_rules_cached():
+    """staff_rules.yamlを読み込む（mtimeでキャッシュ、Cloud RunならGCSから取得）
+
+    返り値はキャッシュ共有オブジェクトのため変更しないこと。
+    変更して保存する場合は load_staff_rules() を使う。
+    """
     global _gcs_loaded
-    config_path = current_app.config['CONFIG_PATH']
-    staff_rules_path = os.path.join(config_path, 'staff_rules.yaml')
+    staff_rules_path = _staff_rules_path()
 
     # GCSから最新版をダウンロード（初回のみ）
     # app.py起動時にダウンロード済みの場合はスキップ
@@ -55,61 +86,105 @@ def load_staff_rules():
         download_from_gcs('config/staff_rules.yaml', staff_rules_path)
         _gcs_loaded = True
 
-    if not os.path.exists(staff_rules_path):
-        return {'staff_by_clinic': {}}
+    try:
+        return load_yaml_cached(staff_rules_path) or _EMPTY_STAFF_RULES
+    except FileNotFoundError:
+        return _EMPTY_STAFF_RULES
+
 
-    with open(staff_rules_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f) or {'staff_by_clinic': {}}
+def load_staff_rules():
+    """staff_rules.yamlを読み込む（呼び出し側で変更可能なコピーを返す）"""
+    return copy.deepcopy(load_staff_rules_cached())
 
 
 def save_staff_rules(data):
-    """staff_rules.yamlに保存（Cloud RunならGCSにもアップロード）"""
-    config_path = current_app.config['CONFIG_PATH']
-    staff_rules_path = os.path.join(config_path, 'staff_rules.yaml')
+    """staff_rules.yamlに保存（Cloud RunならGCSにもアップロード、内容が同一なら何もしない）"""
+    staff_rules_path = _staff_rules_path()
 
-    with open(staff_rules_path, 'w', encoding='utf-8') as f:
-        yaml.dump(data, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+    new_bytes = yaml.dump(data, Dumper=YamlDumper, allow_unicode=True,
+                          default_flow_style=False, sort_keys=False).encode('utf-8')
+    if not write_bytes_atomic(staff_rules_path, new_bytes):
+        return
+
+    invalidate_yaml_cache(staff_rules_path)
 
     # GCSにもアップロード
     upload_to_gcs(staff_rules_path, 'config/staff_rules.yaml')
 
 
-def load_clinics_config():
-    """clinics.yamlを読み込む"""
-    config_path = current_app.config['CONFIG_PATH']
-    clinics_path = os.path.join(config_path, 'clinics.yaml')
+def _staff_in_result_file(path, key):
+    """結果ファイル1件の {分院名: スタッフ名set} を返す（(mtime_ns, size)でキャッシュ）"""
+    cached = _result_staff_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    staff_by_clinic = {}
+    try:
+        with open(path, 'rb') as f:
+            data = orjson.loads(f.read())
+
+        for result in data.get('results', []):
+            clinic_name = result.get('clinic', '')
+            if clinic_name not in staff_by_clinic:
+                staff_by_clinic[clinic_name] = set()
+
+            for detail in result.get('details', []):
+                doctor_name = detail.get('doctor', '')
+                if doctor_name:
+                    staff_by_clinic[clinic_name].add(doctor_name)
+
+    except Exception:
+        pass
+
+    _result_staff_cache[path] = (key, staff_by_clinic)
+    return staff_by_clinic
 
-    with open(clinics_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
 
+def get_all_staff_from_results(clinic_filter=None):
+    """チェック結果から全スタッフ名を収集（空きがなくても含む）
 
-def get_all_staff_from_results():
-    """チェック結果から全スタッフ名を収集（空きがなくても含む）"""
+    clinic_filter を指定した場合はその分院のみ集計する。
+    """
     output_path = current_app.config['OUTPUT_PATH']
-    json_files = glob.glob(os.path.join(output_path, 'slot_check_*.json'))
 
     staff_by_clinic = {}
+    seen_paths = set()
 
-    for json_file in json_files:
+    try:
+        with os.scandir(output_path) as it:
+            entries = [e for e in it
+                       if e.name.startswith('slot_check_') and e.name.endswith('.json')]
+    except OSError:
+        entries = []
+
+    for entry in entries:
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            st = entry.stat()
+        except OSError:
+            continue
+        seen_paths.add(entry.path)
+        file_staff = _staff_in_result_file(entry.path, (st.st_mtime_ns, st.st_size))
 
-            for result in data.get('results', []):
-                clinic_name = result.get('clinic', '')
-                if clinic_name not in staff_by_clinic:
-                    staff_by_clinic[clinic_name] = set()
+        for clinic_name, names in file_staff.items():
+            if clinic_filter is not None and clinic_name != clinic_filter:
+                continue
+            staff_by_clinic.setdefault(clinic_name, set()).update(names)
 
-                for detail in result.get('details', []):
-                    doctor_name = detail.get('doctor', '')
-                    if doctor_name:
-                        staff_by_clinic[clinic_name].add(doctor_name)
-
-        except Exception:
-            continue
+    # 削除された結果ファイルのキャッシュを破棄
+    for path in list(_result_staff_cache):
+        if path not in seen_paths:
+            _result_staff_cache.pop(path, None)
 
     # setをlistに変換
-    return {k: sorted(list(v)) for k, v in staff_by_clinic.items()}
+    return {k: sorted(v) for k, v in staff_by_clinic.items()}
+
+
+@lru_cache(maxsize=8)
+def _compile_exclude_patterns(patterns):
+    """除外パターン（部分一致）を1本の正規表現にまとめる（パターンのタプル単位でキャッシュ）"""
+    if not patterns:
+        return None
+    return re.compile('|'.join(map(re.escape, patterns)))
 
 
 def get_all_headers_from_debug():
@@ -118,118 +193,146 @@ def get_all_headers_from_debug():
     return {}
 
 
+def _valid_clinic_names(clinics_config):
+    """clinics.yamlに存在するクリニック名（ゴースト排除用）"""
+    valid_clinic_names = set()
+    for section in ['clinics', 'stransa_clinics', 'gmo_clinics', 'plum_clinics', 'pay_light_clinics']:
+        for clinic in clinics_config.get(section, []):
+            valid_clinic_names.add(clinic['name'])
+    return valid_clinic_names
+
+
+def _exclude_matcher(clinics_config):
+    """clinics.yaml の除外パターンから照合用の正規表現を取得"""
+    exclude_patterns = clinics_config.get('settings', {}).get('exclude_patterns', ['訪問'])
+    return _compile_exclude_patterns(tuple(exclude_patterns))
+
+
+def _build_clinic_payload(clinic_config, staff_from_result, exclude_re):
+    """1分院分のスタッフ情報レスポンスを組み立てる"""
+    # 全スタッフ名を収集（同期データ優先、なければ結果 + 設定ファイル）
+    all_staff_names = set()
+
+    # 同期データがあれば優先的に使用
+    if clinic_config.get('all_staff'):
+        all_staff_names.update(clinic_config.get('all_staff', []))
+    else:
+        # 同期データがない場合は結果ファイルから
+        all_staff_names.update(staff_from_result)
+
+    # 設定ファイルの分類済みスタッフも追加
+    all_staff_names.update(clinic_config.get('doctors', []))
+    all_staff_names.update(clinic_config.get('hygienists', []))
+    all_staff_names.update(clinic_config.get('orthodontists', []))
+    all_staff_names.update(clinic_config.get('disabled', []))
+
+    doctors = set(clinic_config.get('doctors', []))
+    hygienists = set(clinic_config.get('hygienists', []))
+    orthodontists = set(clinic_config.get('orthodontists', []))
+    disabled = set(clinic_config.get('disabled', []))
+    web_booking = set(clinic_config.get('web_booking', []))
+    thresholds = clinic_config.get('slot_threshold', {})
+    memos = clinic_config.get('memos', {})
+    tags = clinic_config.get('tags', {})
+
+    payload = {
+        'staff': [],
+        'has_web_booking_filter': len(web_booking) > 0,
+        'slot_threshold': {
+            'doctor': thresholds.get('doctor', 30),
+            'hygienist': thresholds.get('hygienist', 30),
+            'orthodontist': thresholds.get('orthodontist', 30),
+        }
+    }
+
+    for staff_name in sorted(all_staff_names):
+        # カテゴリを判定（複数カテゴリ対応）
+        categories = []
+        if staff_name in doctors:
+            categories.append('doctor')
+        if staff_name in hygienists:
+            categories.append('hygienist')
+        if staff_name in orthodontists:
+            categories.append('orthodontist')
+        # 互換性のため単一categoryも保持
+        category = categories[0] if categories else 'unknown'
+
+        # 除外パターンに該当するかチェック
+        auto_disabled = exclude_re is not None and exclude_re.search(staff_name) is not None
+
+        # 有効/無効を判定
+        is_disabled = staff_name in disabled or auto_disabled
+
+        # WEB予約受付判定
+        is_web_booking = staff_name in web_booking
+
+        payload['staff'].append({
+            'name': staff_name,
+            'category': category,
+            'categories': categories,
+            'enabled': not is_disabled,
+            'auto_disabled': auto_disabled,  # 自動除外（訪問系など）
+            'web_booking': is_web_booking,
+            'memo': memos.get(staff_name, ''),
+            'tags': tags.get(staff_name, [])
+        })
+
+    return payload
+
+
 @bp.route('/', methods=['GET'])
 def get_all_staff():
     """全スタッフ情報を取得"""
     # 結果ファイルからスタッフ名を収集
     staff_from_results = get_all_staff_from_results()
 
-    # 設定ファイルからスタッフ分類を読み込む
-    staff_rules = load_staff_rules()
+    # 設定ファイルからスタッフ分類を読み込む（読み取りのみ）
+    staff_rules = load_staff_rules_cached()
     staff_by_clinic = staff_rules.get('staff_by_clinic', {})
 
-    # clinics.yaml から除外パターンを取得
-    clinics_config = load_clinics_config()
-    exclude_patterns = clinics_config.get('settings', {}).get('exclude_patterns', ['訪問'])
+    # clinics.yaml から除外パターンと有効クリニックを取得
+    clinics_config = load_clinics_config_cached()
+    exclude_re = _exclude_matcher(clinics_config)
+    valid_clinic_names = _valid_clinic_names(clinics_config)
+
+    # CLINIC_ORDER順 + 未知のクリニックは名前順で末尾（有効クリニックのみ）
+    all_clinic_names = (staff_from_results.keys() | staff_by_clinic.keys()) & valid_clinic_names
+    all_clinic_names.update(CLINIC_ORDER_SET & valid_clinic_names)
+    unranked = len(CLINIC_ORDER)
+    ordered_names = sorted(all_clinic_names, key=lambda n: (CLINIC_RANK.get(n, unranked), n))
 
     # マージした結果を作成（開院順）
     result = {}
-
-    # clinics.yamlに存在するクリニックのみ表示（ゴースト排除）
-    valid_clinic_names = set()
-    for section in ['clinics', 'stransa_clinics', 'gmo_clinics', 'plum_clinics', 'pay_light_clinics']:
-        for clinic in clinics_config.get(section, []):
-            valid_clinic_names.add(clinic['name'])
-
-    # CLINIC_ORDER順 + 未知のクリニックは末尾（有効クリニックのみ）
-    all_clinic_names = (set(staff_from_results.keys()) | set(staff_by_clinic.keys())) & valid_clinic_names
-    ordered_names = [n for n in CLINIC_ORDER if n in valid_clinic_names]
-    for name in sorted(all_clinic_names):
-        if name not in ordered_names:
-            ordered_names.append(name)
-
     for clinic_name in ordered_names:
-        clinic_config = staff_by_clinic.get(clinic_name, {})
-        staff_from_result = staff_from_results.get(clinic_name, [])
-
-        # 全スタッフ名を収集（同期データ優先、なければ結果 + 設定ファイル）
-        all_staff_names = set()
-
-        # 同期データがあれば優先的に使用
-        if clinic_config.get('all_staff'):
-            all_staff_names.update(clinic_config.get('all_staff', []))
-        else:
-            # 同期データがない場合は結果ファイルから
-            all_staff_names.update(staff_from_result)
-
-        # 設定ファイルの分類済みスタッフも追加
-        all_staff_names.update(clinic_config.get('doctors', []))
-        all_staff_names.update(clinic_config.get('hygienists', []))
-        all_staff_names.update(clinic_config.get('orthodontists', []))
-        all_staff_names.update(clinic_config.get('disabled', []))
-
-        doctors = set(clinic_config.get('doctors', []))
-        hygienists = set(clinic_config.get('hygienists', []))
-        orthodontists = set(clinic_config.get('orthodontists', []))
-        disabled = clinic_config.get('disabled', [])
-        web_booking = set(clinic_config.get('web_booking', []))
-        thresholds = clinic_config.get('slot_threshold', {})
-
-        result[clinic_name] = {
-            'staff': [],
-            'has_web_booking_filter': len(web_booking) > 0,
-            'slot_threshold': {
-                'doctor': thresholds.get('doctor', 30),
-                'hygienist': thresholds.get('hygienist', 30),
-                'orthodontist': thresholds.get('orthodontist', 30),
-            }
-        }
+        result[clinic_name] = _build_clinic_payload(
+            staff_by_clinic.get(clinic_name, {}),
+            staff_from_results.get(clinic_name, []),
+            exclude_re,
+        )
 
-        for staff_name in sorted(all_staff_names):
-            # カテゴリを判定（複数カテゴリ対応）
-            categories = []
-            if staff_name in doctors:
-                categories.append('doctor')
-            if staff_name in hygienists:
-                categories.append('hygienist')
-            if staff_name in orthodontists:
-                categories.append('orthodontist')
-            # 互換性のため単一categoryも保持
-            category = categories[0] if categories else 'unknown'
-
-            # 除外パターンに該当するかチェック
-            auto_disabled = any(pattern in staff_name for pattern in exclude_patterns)
-
-            # 有効/無効を判定
-            is_disabled = staff_name in disabled or auto_disabled
-
-            # WEB予約受付判定
-            is_web_booking = staff_name in web_booking
-
-            # メモとタグを取得
-            memos = clinic_config.get('memos', {})
-            tags = clinic_config.get('tags', {})
-
-            result[clinic_name]['staff'].append({
-                'name': staff_name,
-                'category': category,
-                'categories': categories,
-                'enabled': not is_disabled,
-                'auto_disabled': auto_disabled,  # 自動除外（訪問系など）
-                'web_booking': is_web_booking,
-                'memo': memos.get(staff_name, ''),
-                'tags': tags.get(staff_name, [])
-            })
-
-    return jsonify(result)
+    return json_response(result)
 
 
 @bp.route('/<clinic_name>', methods=['GET'])
 def get_clinic_staff(clinic_name):
-    """特定分院のスタッフ情報を取得"""
-    all_staff = get_all_staff().get_json()
-    clinic_staff = all_staff.get(clinic_name, {'staff': []})
-    return jsonify(clinic_staff)
+    """特定分院のスタッフ情報を取得（対象分院のみ組み立てる）"""
+    clinics_config = load_clinics_config_cached()
+    if clinic_name not in _valid_clinic_names(clinics_config):
+        return json_response({'staff': []})
+
+    staff_from_results = get_all_staff_from_results(clinic_filter=clinic_name)
+    staff_by_clinic = load_staff_rules_cached().get('staff_by_clinic', {})
+
+    # 全件取得時と同じく、開院順リストにも結果/設定にもない分院は空扱い
+    if (clinic_name not in CLINIC_ORDER_SET and clinic_name not in staff_from_results
+            and clinic_name not in staff_by_clinic):
+        return json_response({'staff': []})
+
+    return json_response(_build_clinic_payload(
+        staff_by_clinic.get(clinic_name, {}),
+        staff_from_results.get(clinic_name, []),
+        _exclude_matcher(clinics_config),
+    ))
 
 
 @bp.route('/<clinic_name>', methods=['POST'])
@@ -246,7 +349,7 @@ def update_staff_category(clinic_name):
             categories = [cat]
 
     if not staff_name:
-        return jsonify({'error': 'name is required'}), 400
+        return json_response({'error': 'name is required'}, 400)
 
     # 設定を読み込み
     staff_rules = load_staff_rules()
@@ -274,7 +377,7 @@ def update_staff_category(clinic_name):
     # 保存
     save_staff_rules(staff_rules)
 
-    return jsonify({'success': True, 'clinic': clinic_name, 'name': staff_name, 'categories': categories})
+    return json_response({'success': True, 'clinic': clinic_name, 'name': staff_name, 'categories': categories})
 
 
 @bp.route('/<clinic_name>/toggle', methods=['POST'])
@@ -284,7 +387,7 @@ def toggle_staff_enabled(clinic_name):
     staff_name = data.get('name')
 
     if not staff_name:
-        return jsonify({'error': 'name is required'}), 400
+        return json_response({'error': 'name is required'}, 400)
 
     # 設定を読み込み
     staff_rules = load_staff_rules()
@@ -311,7 +414,7 @@ def toggle_staff_enabled(clinic_name):
     # 保存
     save_staff_rules(staff_rules)
 
-    return jsonify({'success': True, 'clinic': clinic_name, 'name': staff_name, 'enabled': enabled})
+    return json_response({'success': True, 'clinic': clinic_name, 'name': staff_name, 'enabled': enabled})
 
 
 @bp.route('/<clinic_name>/web-booking', methods=['POST'])
@@ -321,7 +424,7 @@ def toggle_web_booking(clinic_name):
     staff_name = data.get('name')
 
     if not staff_name:
-        return jsonify({'error': 'name is required'}), 400
+        return json_response({'error': 'name is required'}, 400)
 
     # 設定を読み込み
     staff_rules = load_staff_rules()
@@ -348,7 +451,7 @@ def toggle_web_booking(clinic_name):
     # 保存
     save_staff_rules(staff_rules)
 
-    return jsonify({'success': True, 'clinic': clinic_name, 'name': staff_name, 'web_booking': web_booking})
+    return json_response({'success': True, 'clinic': clinic_name, 'name': staff_name, 'web_booking': web_booking})
 
 
 @bp.route('/<clinic_name>/memo', methods=['POST'])
@@ -359,7 +462,7 @@ def update_staff_memo(clinic_name):
     memo = data.get('memo', '')
 
     if not staff_name:
-        return jsonify({'error': 'name is required'}), 400
+        return json_response({'error': 'name is required'}, 400)
 
     # 設定を読み込み
     staff_rules = load_staff_rules()
@@ -384,7 +487,7 @@ def update_staff_memo(clinic_name):
     # 保存
     save_staff_rules(staff_rules)
 
-    return jsonify({'success': True, 'clinic': clinic_name, 'name': staff_name, 'memo': memo})
+    return json_response({'success': True, 'clinic': clinic_name, 'name': staff_name, 'memo': memo})
 
 
 @bp.route('/<clinic_name>/tags', methods=['POST'])
@@ -395,7 +498,7 @@ def update_staff_tags(clinic_name):
     tags = data.get('tags', [])
 
     if not staff_name:
-        return jsonify({'error': 'name is required'}), 400
+        return json_response({'error': 'name is required'}, 400)
 
     # 設定を読み込み
     staff_rules = load_staff_rules()
@@ -420,7 +523,7 @@ def update_staff_tags(clinic_name):
     # 保存
     save_staff_rules(staff_rules)
 
-    return jsonify({'success': True, 'clinic': clinic_name, 'name': staff_name, 'tags': tags})
+    return json_response({'success': True, 'clinic': clinic_name, 'name': staff_name, 'tags': tags})
 
 
 @bp.route('/<clinic_name>/threshold', methods=['POST'])
@@ -431,7 +534,7 @@ def update_threshold(clinic_name):
     hygienist_threshold = data.get('hygienist')
 
     if doctor_threshold is None and hygienist_threshold is None:
-        return jsonify({'error': 'doctor or hygienist threshold is required'}), 400
+        return json_response({'error': 'doctor or hygienist threshold is required'}, 400)
 
     # 設定を読み込み
     staff_rules = load_staff_rules()
@@ -455,7 +558,7 @@ def update_threshold(clinic_name):
     # 保存
     save_staff_rules(staff_rules)
 
-    return jsonify({
+    return json_response({
         'success': True,
         'clinic': clinic_name,
         'slot_threshold': clinic_config['slot_threshold']
@@ -468,44 +571,40 @@ def sync_staff():
     global _sync_status
     with _sync_lock:
         if _sync_status['status'] == 'running':
-            return jsonify({'success': True, 'status': 'already_running', 'message': '同期中です'})
+            return json_response({'success': True, 'status': 'already_running', 'message': '同期中です'})
         _sync_status = {'status': 'running', 'message': '同期開始...', 'results': None}
 
     app = current_app._get_current_object()
     t = threading.Thread(target=_do_sync_staff, args=(app,), daemon=True)
     t.start()
 
-    return jsonify({'success': True, 'status': 'running', 'message': '同期を開始しました'})
+    return json_response({'success': True, 'status': 'running', 'message': '同期を開始しました'})
 
 
 @bp.route('/sync-status', methods=['GET'])
 def sync_status():
     """スタッフ同期のステータスを返す"""
-    return jsonify(_sync_status)
+    return json_response(_sync_status)
 
 
 def _do_sync_staff(app):
     """バックグラウンドで実行されるスタッフ同期処理"""
     global _sync_status
-    import asyncio
-    import sys
-    import logging as _logging
 
     # バックグラウンドスレッドでもログが Cloud Run に出るよう StreamHandler を追加
-    root_logger = _logging.getLogger()
-    if not any(isinstance(h, _logging.StreamHandler) for h in root_logger.handlers):
-        _sh = _logging.StreamHandler(sys.stdout)
-        _sh.setLevel(_logging.INFO)
+    root_logger = logging.getLogger()
+    if not any(isinstance(h, logging.StreamHandler) for h in root_logger.handlers):
+        _sh = logging.StreamHandler(sys.stdout)
+        _sh.setLevel(logging.INFO)
         root_logger.addHandler(_sh)
 
     with app.app_context():
         try:
-            sys.path.insert(0, app.config['PROJECT_ROOT'])
+            # スクレイパーはplaywrightに依存するため同期実行時にのみインポート
             from src.scraper import sync_all_staff
             from src.scraper_stransa import sync_stransa_staff
             from src.scraper_gmo import sync_gmo_staff
             from src.scraper_pay_light import sync_pay_light_staff
-            from src.config_loader import load_config, get_enabled_clinics
 
             config = load_config()
             clinics = get_enabled_clinics(config)